@@ -0,0 +1,151 @@
+"""
+Background loading of the game assets.
+
+    assets = AssetManager()
+    assets.start()                 # right after the window opened
+    player_name = start_screen(screen)
+    assets.wait()                  # usually done already
+    renderer = TableRenderer(screen, table, assets.background)
+
+While the player types the name, a worker thread decodes the background
+image and the sound effects, opens the music track and reads the
+highscores. The worker never touches the display; wait() finishes on the
+main thread with what needs the display (converting the image to the
+screen format).
+
+Missing optional assets do not stop the game: without the music there is
+no music, without a sound file that effect is silent, and without the
+background image the table is drawn on black. Every asset that could not
+be loaded is listed in `missing` with the reason.
+"""
+import threading
+from pathlib import Path
+
+import pygame
+
+from sounds import EFFECTS, SoundBank
+
+FOLDER = Path(__file__).parent
+
+
+class AssetManager:
+    '''
+    Loads images, sounds, music and highscores on a worker thread.
+
+    Attributes after wait():
+        background (Surface): Background image in the screen format.
+        sounds (SoundBank): Sound effects of the table events.
+        music (bool): Whether the music track is loaded into pygame.mixer.music.
+        store (HighscoreStore): Highscore database, None if it could not be opened.
+        leaderboard (Leaderboard): Index of the saved highscores.
+        missing (list of (str, str)): Assets that could not be loaded and why.
+    '''
+
+    def __init__(self, folder=FOLDER, background='bkg2.png', music='Clown.mp3', effects=EFFECTS,
+                 highscore_db='Highscore.db', highscore_csv='Highscore.csv'):
+        '''
+        Parameters:
+            folder (Path): Folder of the image, music and sound files.
+            background, music (str): File names, relative to folder.
+            effects (dict): Event name -> sound file, see SoundBank.
+            highscore_db (str or Path): Highscore database, created if it does not exist.
+            highscore_csv (str or Path): Old CSV highscores, imported into an empty database once.
+        '''
+        self.folder = Path(folder)
+        self.background_file = background
+        self.music_file = music
+        self.effects = effects
+        self.highscore_db = highscore_db
+        self.highscore_csv = highscore_csv
+
+        self.background = None
+        self.sounds = None
+        self.music = False
+        self.store = None
+        self.leaderboard = None
+        self.missing = []
+        self._image = None
+        self._thread = None
+
+    def start(self):
+        '''
+        Starts loading on the worker thread. Call it after pygame.display.set_mode().
+        '''
+        self._thread = threading.Thread(target=self._load, name='assets', daemon=True)
+        self._thread.start()
+        return self
+
+    def ready(self):
+        '''
+        Whether the worker has finished.
+        '''
+        return self._thread is not None and not self._thread.is_alive()
+
+    def wait(self):
+        '''
+        Waits for the worker and prepares the loaded assets for the game loop.
+        Loads everything on the calling thread if start() was not called.
+        '''
+        if self._thread is None:
+            self._load()
+        else:
+            self._thread.join()
+
+        # Converting needs the display, so it runs on the main thread
+        if self._image is not None:
+            self.background = self._image.convert_alpha()
+        else:
+            self.background = pygame.Surface(pygame.display.get_surface().get_size())
+        return self
+
+    def _load(self):
+        # Whatever goes wrong, the game gets usable defaults instead of a dead worker
+        try:
+            self._load_assets()
+        except Exception as error:
+            self.missing.append(('assets', f'{type(error).__name__}: {error}'))
+        if self.sounds is None:
+            self.sounds = SoundBank({})
+        if self.leaderboard is None:
+            from highscores import Leaderboard
+            self.leaderboard = Leaderboard()
+
+    def _load_assets(self):
+        try:
+            self._image = pygame.image.load(self.folder / self.background_file)
+        except (pygame.error, FileNotFoundError) as error:
+            self.missing.append((self.background_file, str(error)))
+
+        # SoundBank stays silent for effects it cannot load
+        self.sounds = SoundBank(self.effects, folder=self.folder)
+        for name, file in self.effects.items():
+            if name not in self.sounds.sounds:
+                self.missing.append((file, 'no mixer or file not found'))
+
+        try:
+            pygame.mixer.music.load(self.folder / self.music_file)
+            self.music = True
+        except (pygame.error, FileNotFoundError) as error:
+            self.missing.append((self.music_file, str(error)))
+
+        # sqlite3 and csv are only imported here, off the launch path
+        import csv
+        import sqlite3
+        from highscores import HighscoreStore, Leaderboard
+        try:
+            self.store = HighscoreStore(self.highscore_db, check_same_thread=False)
+        except (sqlite3.Error, OSError) as error:
+            # No highscores is better than no game
+            self.missing.append((str(self.highscore_db), str(error)))
+            return
+        try:
+            # import_csv checks again inside its transaction, another instance may import first
+            if not len(self.store) and Path(self.highscore_csv).exists():
+                self.store.import_csv(self.highscore_csv, only_if_empty=True)
+        except (sqlite3.Error, OSError, ValueError, KeyError, csv.Error) as error:
+            # A broken CSV is not imported at all, the import is one transaction
+            self.missing.append((str(self.highscore_csv), f'{type(error).__name__}: {error}'))
+        try:
+            self.leaderboard = Leaderboard.from_store(self.store)
+        except sqlite3.Error as error:
+            self.missing.append((str(self.highscore_db), str(error)))
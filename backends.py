@@ -0,0 +1,830 @@
+"""
+Physics backends for the headless table.
+
+    backend = load(table, 'auto')       # 'reference', 'numba' or 'auto'
+    events = backend.step(inputs)       # one frame, like table.step()
+    trajectory = backend.run(inputs)    # many recorded frames in one call
+    backend.sync()                      # table now holds the state of the backend
+
+The reference backend is Table.step() itself: Ball, Bat, Rect and Triangle
+objects and their methods. The numba backend runs the same frame on flat
+float arrays: the changing state of the table is one float64 array (ball
+positions and velocities, movers, bat angles, flags, score), and the
+geometry (obstacle polygons and SAT axes, bumpers, the pose tables of the
+bats) is packed once into arrays when the backend is loaded. The kernel
+follows Table.step() in discrete mode operation by operation, so both
+backends give the same trajectory.
+
+If Numba is not installed, load(table, 'auto') gives the reference backend,
+and so does load(table, 'numba') (with a warning). The kernel itself is
+plain Python, so NumbaBackend(table, compiled=False) runs it without Numba,
+e.g. to check it against the reference:
+
+    python backends.py --frames 20000               # record with autoplay, compare the backends
+    python backends.py --replay session.rpl         # compare on a recorded session
+    python -m pytest tests/test_backends.py         # the same check as a test
+"""
+import math
+import warnings
+
+import numpy as np
+
+from engine import LAUNCH, LEFT, RIGHT, RESET
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Events in the order of the event counts of the kernel
+EVENTS = ('launch', 'bumper', 'drain', 'reset')
+
+# Layout of the state array
+BALL1 = 0              # x, y, vx, vy
+BALL2 = 4              # x, y, vx, vy
+BIG_BALL = 8           # x, y
+RECT1 = 10             # x, y
+RECT_SPEED = 12
+BIG_BALL_SPEED = 13
+TICKS = 14
+BALL2_TIME_BEGIN = 15
+BATS = 16              # angle, direction, count, active of left_bat, right_bat, starter_bat
+BALL2_HERE = 28
+STARTER1 = 29
+STARTER2 = 30
+SCORE = 31
+ROUNDNR = 32
+FRAME = 33
+BEST = 34              # Best score of the finished rounds, -inf in round 0
+RECORDED = 35          # Score of the current round at the end of the last frame (table.scores[-1])
+LAST_DRAIN = 36        # x, y, nan before the first drain
+STATE_SIZE = 38
+
+# Layout of the parameter array
+WIDTH, HEIGHT, HOLE_W, HOLE_H, DAMP, ROLL, FPS_MULTIPLYER, LAUNCH_SPEED, STEP_MS, FRAME_MS = range(10)
+RADIUS1, RADIUS2, GRAV_X, GRAV_Y, RECT_WIDTH, RECT_HEIGHT, RECT_INDEX, BIG_BALL_INDEX = range(10, 18)
+BAT_COS, BAT_SIN = 18, 20  # Rotation of the normal to the tangent in Ball.collide, left and right bat
+TANGENT_COS, TANGENT_SIN = 22, 23  # Rotation by 90 degrees of the obstacle response
+PARAMS_SIZE = 24
+
+# Columns of a trajectory: both balls after every frame, score and round
+TRAJECTORY = ('x1', 'y1', 'vx1', 'vy1', 'x2', 'y2', 'vx2', 'vy2', 'score', 'roundnr')
+
+
+def jit(function):
+    '''
+    Compiles a kernel function with Numba, or leaves it as it is without Numba.
+    The plain function stays available as function.py_func.
+    '''
+    if numba is None:
+        function.py_func = function
+        return function
+    return numba.njit(cache=True)(function)
+
+
+def observe(table):
+    '''
+    Returns the row of a trajectory (see TRAJECTORY) for the current state of a Table.
+    '''
+    ball1, ball2 = table.ball1, table.ball2
+    return (ball1.position.x, ball1.position.y, ball1.velocity.x, ball1.velocity.y,
+            ball2.position.x, ball2.position.y, ball2.velocity.x, ball2.velocity.y,
+            table.score, table.roundnr)
+
+
+class ReferenceBackend:
+    '''
+    Table.step() with the Ball, Bat, Rect and Triangle objects.
+    '''
+    name = 'reference'
+
+    def __init__(self, table):
+        self.table = table
+
+    def step(self, inputs=0):
+        '''
+        Advances the table by one frame and returns its events, see Table.step().
+        '''
+        return self.table.step(inputs)
+
+    def run(self, inputs, trajectory=True):
+        '''
+        Advances the table by one frame per entry of inputs.
+
+        Returns:
+            trajectory (ndarray, shape (frames, 10)): The columns of TRAJECTORY after
+            every frame, None with trajectory=False.
+        '''
+        table = self.table
+        rows = np.empty((len(inputs) if trajectory else 0, len(TRAJECTORY)))
+        for frame, bits in enumerate(inputs):
+            table.step(int(bits))
+            if trajectory:
+                rows[frame] = observe(table)
+        return rows if trajectory else None
+
+    def get_state(self):
+        return self.table.get_state()
+
+    def sync(self):
+        '''
+        Returns the table with the state of the backend.
+        '''
+        return self.table
+
+
+class NumbaBackend:
+    '''
+    Table.step() in discrete mode as a kernel on flat float arrays, compiled with Numba.
+
+    Attributes:
+        state (ndarray, shape (STATE_SIZE,)): Everything that changes, see the layout constants.
+        params (ndarray, shape (PARAMS_SIZE,)): Settings of the table.
+        geometry (tuple of ndarray): Obstacles, bumpers and bat poses, see pack_table().
+    '''
+    name = 'numba'
+
+    def __init__(self, table, compiled=True):
+        '''
+        Parameters:
+            table (Table): Table to take the geometry and the current state from.
+            compiled (bool): Run the kernel compiled by Numba (False: as plain Python, e.g. to debug it).
+        '''
+        if compiled and numba is None:
+            raise ImportError('the numba backend needs Numba (pip install numba)')
+        if table.swept:
+            raise ValueError('the numba backend only runs tables in discrete mode (swept=False)')
+        if any(bumper.radius < 11 for bumper in table.bumpers):
+            raise ValueError('the numba backend needs bumpers with a radius of at least 11')
+        self.table = table
+        self.kernel = run_frames if compiled else run_frames.py_func
+        self.params, self.geometry = pack_table(table)
+        self.state = pack_state(table.get_state())
+        self.state[LAST_DRAIN:LAST_DRAIN + 2] = table.last_drain or (math.nan, math.nan)
+        self._inputs = np.zeros(1, dtype=np.int64)
+        self._events = np.zeros(len(EVENTS), dtype=np.int64)
+        self._no_trajectory = np.empty((0, len(TRAJECTORY)))
+
+    def step(self, inputs=0):
+        '''
+        Advances the table by one frame.
+
+        Returns:
+            events (list of str): Events of the frame, grouped by kind in the order of EVENTS.
+        '''
+        self._inputs[0] = inputs
+        self._events[:] = 0
+        self.kernel(self.state, self._inputs, self._events, self._no_trajectory, self.params, self.geometry)
+        return [name for name, count in zip(EVENTS, self._events) for _ in range(count)]
+
+    def run(self, inputs, trajectory=True):
+        '''
+        Advances the table by one frame per entry of inputs in one call of the kernel.
+
+        Returns:
+            trajectory (ndarray, shape (frames, 10)): The columns of TRAJECTORY after
+            every frame, None with trajectory=False.
+        '''
+        inputs = np.asarray(inputs, dtype=np.int64)
+        rows = np.empty((len(inputs) if trajectory else 0, len(TRAJECTORY)))
+        self._events[:] = 0
+        self.kernel(self.state, inputs, self._events, rows, self.params, self.geometry)
+        return rows if trajectory else None
+
+    def get_state(self):
+        '''
+        Returns the state in the form of Table.get_state().
+        '''
+        return unpack_state(self.state)
+
+    def sync(self):
+        '''
+        Writes the state of the backend into the table and returns the table.
+        '''
+        table = self.table
+        table.set_state(self.get_state())
+        x, y = self.state[LAST_DRAIN:LAST_DRAIN + 2]
+        table.last_drain = None if math.isnan(x) else (float(x), float(y))
+        return table
+
+
+BACKENDS = {'reference': ReferenceBackend, 'numba': NumbaBackend}
+
+
+def load(table, backend='auto'):
+    '''
+    Returns a backend for a table.
+
+    Parameters:
+        table (Table): The table to run.
+        backend (str): 'reference', 'numba', or 'auto' for numba where it is
+            installed and can run the table, the reference otherwise.
+    '''
+    if backend not in BACKENDS and backend != 'auto':
+        raise ValueError(f"unknown backend {backend!r}, use 'auto' or one of {', '.join(BACKENDS)}")
+    if backend == 'reference':
+        return ReferenceBackend(table)
+    if numba is None:
+        if backend == 'numba':
+            warnings.warn('Numba is not installed, using the reference backend')
+        return ReferenceBackend(table)
+    if backend == 'auto':
+        try:
+            return NumbaBackend(table)
+        except ValueError:
+            return ReferenceBackend(table)
+    return NumbaBackend(table)
+
+
+def pack_state(state):
+    '''
+    Packs a state of Table.get_state() into a state array.
+    '''
+    array = np.zeros(STATE_SIZE)
+    array[BALL1:BALL1 + 4] = state['ball1']
+    array[BALL2:BALL2 + 4] = state['ball2']
+    array[BIG_BALL:BIG_BALL + 2] = state['big_ball']
+    array[RECT1:RECT1 + 2] = state['rect1']
+    array[RECT_SPEED] = state['rect_speed']
+    array[BIG_BALL_SPEED] = state['big_ball_speed']
+    array[TICKS] = state['ticks']
+    array[BALL2_TIME_BEGIN] = state['ball2_time_begin']
+    array[BATS:BATS + 12] = [value for bat in state['bats'] for value in bat]
+    array[BALL2_HERE] = state['ball2_here']
+    array[STARTER1] = state['starter1']
+    array[STARTER2] = state['starter2']
+    array[SCORE] = array[RECORDED] = state['score']
+    array[ROUNDNR] = state['roundnr']
+    array[FRAME] = state['frame']
+    array[BEST] = state['best'] if state['roundnr'] else -math.inf
+    array[LAST_DRAIN:LAST_DRAIN + 2] = math.nan
+    return array
+
+
+def unpack_state(array):
+    '''
+    Unpacks a state array into a state for Table.set_state().
+    '''
+    bats = [tuple(int(value) for value in array[BATS + 4 * k:BATS + 4 * k + 4]) for k in range(3)]
+    return {'ball1': tuple(float(value) for value in array[BALL1:BALL1 + 4]),
+            'ball2': tuple(float(value) for value in array[BALL2:BALL2 + 4]),
+            'big_ball': tuple(float(value) for value in array[BIG_BALL:BIG_BALL + 2]),
+            'rect1': tuple(float(value) for value in array[RECT1:RECT1 + 2]),
+            'bats': bats,
+            'rect_speed': float(array[RECT_SPEED]),
+            'big_ball_speed': float(array[BIG_BALL_SPEED]),
+            'ball2_here': bool(array[BALL2_HERE]),
+            'starter1': bool(array[STARTER1]),
+            'starter2': bool(array[STARTER2]),
+            'score': int(array[SCORE]),
+            'best': int(array[BEST]) if array[ROUNDNR] else 0,
+            'roundnr': int(array[ROUNDNR]),
+            'frame': int(array[FRAME]),
+            'ticks': float(array[TICKS]),
+            'ball2_time_begin': float(array[BALL2_TIME_BEGIN])}
+
+
+def pack_table(table):
+    '''
+    Packs the settings and the geometry of a table into arrays for the kernel.
+
+    Returns:
+        params (ndarray): See the parameter layout constants.
+        geometry (tuple): obstacle_vertices (p, 4, 2), obstacle_axes (p, 4, 4) with rows
+            (nx, ny, low, high), obstacle_counts (p, 2) with the number of corners and axes,
+            bumpers (k, 3) with rows (x, y, radius), bat_info (3, 3) with rows (first angle,
+            right, anschlag), bat_vertices (3, a, 4, 2), bat_axes (3, a, 4, 4), bat_counts (3, a).
+    '''
+    params = np.zeros(PARAMS_SIZE)
+    params[WIDTH], params[HEIGHT] = table.width, table.height
+    params[HOLE_W], params[HOLE_H] = table.hole_w, table.hole_h
+    params[DAMP], params[ROLL] = table.damp, table.roll
+    params[FPS_MULTIPLYER], params[LAUNCH_SPEED] = table.fps_multiplyer, table.launch
+    params[STEP_MS], params[FRAME_MS] = table.step_ms, table.frame_ms
+    params[RADIUS1], params[RADIUS2] = table.ball1.radius, table.ball2.radius
+    params[GRAV_X], params[GRAV_Y] = table.ball1.grav.x, table.ball1.grav.y
+    params[RECT_WIDTH], params[RECT_HEIGHT] = table.rect1.width, table.rect1.height
+    params[RECT_INDEX] = table.obstacles.index(table.rect1)
+    params[BIG_BALL_INDEX] = table.bumpers.index(table.big_ball)
+    # Same angles as Vector.rotate(), so the kernel needs no trigonometry
+    for k, bat in enumerate((table.left_bat, table.right_bat)):
+        angle = math.radians(-90 * bat.right)
+        params[BAT_COS + k], params[BAT_SIN + k] = math.cos(angle), math.sin(angle)
+    params[TANGENT_COS], params[TANGENT_SIN] = math.cos(math.radians(90)), math.sin(math.radians(90))
+
+    count = len(table.obstacles)
+    obstacle_vertices = np.zeros((count, 4, 2))
+    obstacle_axes = np.zeros((count, 4, 4))
+    obstacle_counts = np.zeros((count, 2), dtype=np.int64)
+    for j, obj in enumerate(table.obstacles):
+        vertices, axes = obj.polygon()
+        obstacle_vertices[j, :len(vertices)] = vertices
+        obstacle_axes[j, :len(axes)] = axes
+        obstacle_counts[j] = len(vertices), len(axes)
+
+    bumpers = np.array([(bumper.position.x, bumper.position.y, bumper.radius) for bumper in table.bumpers],
+                       dtype=float).reshape(-1, 3)
+
+    bat_info = np.zeros((3, 3), dtype=np.int64)
+    poses = max(len(bat.poses) for bat in table.bats)
+    bat_vertices = np.zeros((3, poses, 4, 2))
+    bat_axes = np.zeros((3, poses, 4, 4))
+    bat_counts = np.zeros((3, poses), dtype=np.int64)
+    for k, bat in enumerate(table.bats):
+        first = min(bat.poses)
+        bat_info[k] = first, bat.right, bat.anschlag
+        for angle in range(first, max(bat.poses) + 1):
+            _, points, _, axes = bat.pose(angle)
+            bat_vertices[k, angle - first] = points
+            bat_axes[k, angle - first, :len(axes)] = axes
+            bat_counts[k, angle - first] = len(axes)
+
+    return params, (obstacle_vertices, obstacle_axes, obstacle_counts, bumpers,
+                    bat_info, bat_vertices, bat_axes, bat_counts)
+
+
+# Kernel: the operations of Table.step() in discrete mode in the same order,
+# on the state array instead of Ball, Bat, Rect and Triangle objects
+
+@jit
+def circle_sat(px, py, radius, vertices, vertex_count, axes, axis_count):
+    '''
+    collision.circle_sat() on arrays, returns (hit, nx, ny).
+    '''
+    best_depth = math.inf
+    best_x = 0.0
+    best_y = 0.0
+    outside = False
+    for i in range(axis_count):
+        nx, ny, low, high = axes[i, 0], axes[i, 1], axes[i, 2], axes[i, 3]
+        center = px * nx + py * ny
+        if center - radius > high or center + radius < low:
+            return False, 0.0, 0.0
+        if center > high:
+            outside = True
+        depth = high - center + radius
+        if depth < best_depth:
+            best_depth, best_x, best_y = depth, nx, ny
+    if not outside:
+        return True, best_x, best_y
+
+    # Axis through the closest corner
+    closest = math.inf
+    cx = 0.0
+    cy = 0.0
+    for i in range(vertex_count):
+        x, y = vertices[i, 0], vertices[i, 1]
+        d2 = (px - x) * (px - x) + (py - y) * (py - y)
+        if d2 < closest:
+            closest, cx, cy = d2, x, y
+    distance = math.sqrt(closest)
+    nx = (px - cx) / distance
+    ny = (py - cy) / distance
+    center = px * nx + py * ny
+    high = -math.inf
+    low = math.inf
+    for i in range(vertex_count):
+        projection = vertices[i, 0] * nx + vertices[i, 1] * ny
+        high = max(high, projection)
+        low = min(low, projection)
+    if center - radius > high or center + radius < low:
+        return False, 0.0, 0.0
+    depth = high - center + radius
+    if depth < best_depth:
+        best_x, best_y = nx, ny
+    return True, best_x, best_y
+
+
+@jit
+def polygon_axes(vertices, count, axes):
+    '''
+    collision.polygon_axes() into an array, returns the number of axes.
+    '''
+    cx = 0.0
+    cy = 0.0
+    for i in range(count):
+        cx += vertices[i, 0]
+        cy += vertices[i, 1]
+    cx /= count
+    cy /= count
+    found = 0
+    for i in range(count):
+        ax, ay = vertices[i, 0], vertices[i, 1]
+        bx, by = vertices[(i + 1) % count, 0], vertices[(i + 1) % count, 1]
+        nx = by - ay
+        ny = ax - bx
+        length = math.hypot(nx, ny)
+        if length == 0:
+            continue
+        nx /= length
+        ny /= length
+        if (ax - cx) * nx + (ay - cy) * ny < 0:
+            nx, ny = -nx, -ny
+        low = math.inf
+        high = -math.inf
+        for j in range(count):
+            projection = vertices[j, 0] * nx + vertices[j, 1] * ny
+            low = min(low, projection)
+            high = max(high, projection)
+        axes[found, 0], axes[found, 1], axes[found, 2], axes[found, 3] = nx, ny, low, high
+        found += 1
+    return found
+
+
+@jit
+def speed(state, ball):
+    return math.sqrt(state[ball + 2] * state[ball + 2] + state[ball + 3] * state[ball + 3])
+
+
+@jit
+def reset_ball(state, ball):
+    # Ball.reset()
+    state[ball], state[ball + 1], state[ball + 2], state[ball + 3] = 20.0, 660.0, 0.0, 0.0
+
+
+@jit
+def new_round(state):
+    # Table.new_round()
+    state[ROUNDNR] += 1
+    state[BEST] = max(state[BEST], state[RECORDED])
+    state[SCORE] = 0
+    state[RECORDED] = 0
+    state[BALL2_HERE] = 0
+    reset_ball(state, BALL1)
+    reset_ball(state, BALL2)
+
+
+@jit
+def bounce(state, ball, radius, x, y, bumper_radius, events):
+    '''
+    Ball.check_collision() with a big bumper, returns whether the ball left fast enough for ball2.
+    '''
+    cx = x - state[ball]
+    cy = y - state[ball + 1]
+    distance = math.sqrt(cx * cx + cy * cy)
+    if distance == 0:
+        distance = 1
+    if distance > max(radius, bumper_radius):
+        return False
+    length = math.sqrt(cx * cx + cy * cy)
+    if length != 0:
+        cx /= length
+        cy /= length
+    state[ball] -= cx
+    state[ball + 1] -= cy
+    events[1] += 1
+    state[ball + 2] *= -1.1
+    state[ball + 3] *= -1.1
+    return speed(state, ball) >= 7
+
+
+@jit
+def collide_balls(state, radius1, radius2):
+    # Ball.check_collision() of ball1 with ball2
+    cx = state[BALL2] - state[BALL1]
+    cy = state[BALL2 + 1] - state[BALL1 + 1]
+    distance = math.sqrt(cx * cx + cy * cy)
+    if distance == 0:
+        distance = 1
+    if distance > max(radius1, radius2):
+        return
+    length = math.sqrt(cx * cx + cy * cy)
+    if length != 0:
+        cx /= length
+        cy /= length
+    vx1, vy1 = state[BALL1 + 2], state[BALL1 + 3]
+    vx2, vy2 = state[BALL2 + 2], state[BALL2 + 3]
+    state[BALL1] -= cx
+    state[BALL1 + 1] -= cy
+    state[BALL2] += cx
+    state[BALL2 + 1] += cy
+    state[BALL2 + 2], state[BALL2 + 3] = vx1 * 0.8, vy1 * 0.8
+    state[BALL1 + 2], state[BALL1 + 3] = vx2 * 0.8, vy2 * 0.8
+
+
+@jit
+def flip(state, k, bat_info):
+    # Bat.flip()
+    bat = BATS + 4 * k
+    angle, direction, count, active = state[bat], state[bat + 1], state[bat + 2], state[bat + 3]
+    right = bat_info[k, 1]
+    at_stop = angle == -bat_info[k, 2] * right or angle == 20 * right
+    if not at_stop and active == 0 and count >= 1:
+        return
+    if at_stop:
+        direction *= -1
+        if angle == 20 * right:
+            count += 1
+    angle -= 1 * direction * active
+    active = 0 if count >= 1 else 1
+    state[bat], state[bat + 1], state[bat + 2], state[bat + 3] = angle, direction, count, active
+
+
+@jit
+def hit_bat(state, ball, k, nx, ny, cos, sin):
+    # Ball.collide() at bat k
+    boost = state[BATS + 4 * k + 3] * 1
+    tx = nx * cos - ny * sin
+    ty = nx * sin + ny * cos
+    vx, vy = state[ball + 2], state[ball + 3]
+    vn = vx * nx + vy * ny
+    vt = vx * tx + vy * ty
+    new_x = -nx * vn + tx * vt
+    new_y = -ny * vn + ty * vt
+    length = math.sqrt(new_x * new_x + new_y * new_y)
+    if length != 0:
+        new_x /= length
+        new_y /= length
+    state[ball] += new_x * 10
+    state[ball + 1] += new_y * 10
+    old = math.sqrt(vx * vx + vy * vy)
+    new_x *= old
+    new_y *= old
+    new_x *= 1 + boost
+    new_y *= 1 + boost
+    state[ball + 2], state[ball + 3] = new_x, new_y
+
+
+@jit
+def move_objects(state, params, obstacle_vertices, obstacle_axes, obstacle_counts, bumpers):
+    # Table.move_objects(), then the polygon of rect1 at its new position like Rect.polygon()
+    radius = params[RADIUS1]
+    width = params[WIDTH]
+    x = state[RECT1]
+    if x < 45 + 2 * radius or (x + params[RECT_WIDTH]) > width - 2 * radius:
+        state[RECT_SPEED] *= -1
+    state[RECT1] += state[RECT_SPEED]
+
+    big_radius = bumpers[int(params[BIG_BALL_INDEX]), 2]
+    if state[BIG_BALL] - big_radius < 46 + 4 * radius:
+        state[BIG_BALL_SPEED] *= -1
+    elif state[BIG_BALL] + big_radius > width - 4 * radius:
+        state[BIG_BALL_SPEED] *= -1
+    state[BIG_BALL] += state[BIG_BALL_SPEED] * 0.2
+
+    j = int(params[RECT_INDEX])
+    x, y = state[RECT1], state[RECT1 + 1]
+    vertices = obstacle_vertices[j]
+    vertices[0, 0], vertices[0, 1] = x, y
+    vertices[1, 0], vertices[1, 1] = x + params[RECT_WIDTH], y
+    vertices[2, 0], vertices[2, 1] = x + params[RECT_WIDTH], y + params[RECT_HEIGHT]
+    vertices[3, 0], vertices[3, 1] = x, y + params[RECT_HEIGHT]
+    obstacle_counts[j, 1] = polygon_axes(vertices, 4, obstacle_axes[j])
+
+
+@jit
+def move_discrete(state, ball, radius, params, events, obstacle_vertices, obstacle_axes, obstacle_counts, bumpers):
+    # Table.move_discrete()
+    big = int(params[BIG_BALL_INDEX])
+    for j in range(bumpers.shape[0]):
+        if j == big:
+            bounce(state, ball, radius, state[BIG_BALL], state[BIG_BALL + 1], bumpers[j, 2], events)
+        else:
+            bounce(state, ball, radius, bumpers[j, 0], bumpers[j, 1], bumpers[j, 2], events)
+
+    # Ball.gravitate()
+    DT = 0.7
+    gx, gy = params[GRAV_X], params[GRAV_Y]
+    state[ball + 2] += gx * (DT * 0.5)
+    state[ball + 3] += gy * (DT * 0.5)
+    state[ball] += state[ball + 2] * DT
+    state[ball + 1] += state[ball + 3] * DT
+    state[ball] += gx * (DT**2 * 0.5)
+    state[ball + 1] += gy * (DT**2 * 0.5)
+
+    rect = int(params[RECT_INDEX])
+    cos, sin = params[TANGENT_COS], params[TANGENT_SIN]
+    for j in range(obstacle_vertices.shape[0]):
+        hit, nx, ny = circle_sat(state[ball], state[ball + 1], radius, obstacle_vertices[j], obstacle_counts[j, 0],
+                                 obstacle_axes[j], obstacle_counts[j, 1])
+        if not hit:
+            continue
+        tx = nx * cos - ny * sin
+        ty = nx * sin + ny * cos
+        vx, vy = state[ball + 2], state[ball + 3]
+        vt = vx * tx + vy * ty
+        vn = vx * nx + vy * ny
+        length = math.sqrt(vx * vx + vy * vy)
+        if length != 0:
+            vx /= length
+            vy /= length
+        state[ball] += vx * -10
+        state[ball + 1] += vy * -10
+        state[ball + 2] = tx * vt - nx * vn
+        state[ball + 3] = ty * vt - ny * vn
+        if j == rect:
+            state[SCORE] += 1
+
+
+@jit
+def check_screen_collide(state, ball, radius, border_x, border_y, damp, roll):
+    # Ball.check_screen_collide()
+    if state[ball + 1] > border_y - radius:
+        state[ball + 1] = border_y - radius + 1
+        state[ball + 3] = state[ball + 3] * damp * (-1)
+        state[ball + 2] = state[ball + 2] * roll
+    if state[ball + 1] < radius:
+        state[ball + 1] += 1
+        state[ball + 3] = state[ball + 3] * damp * (-1)
+    if state[ball] > (border_x - radius):
+        state[ball] -= 1
+        state[ball + 2] = state[ball + 2] * damp * (-1)
+    if state[ball] < radius:
+        state[ball] += 1
+        state[ball + 2] = state[ball + 2] * damp * (-1)
+
+
+@jit
+def step_frame(state, inputs, params, events, geometry):
+    '''
+    Table.step() for one frame.
+    '''
+    (obstacle_vertices, obstacle_axes, obstacle_counts, bumpers,
+     bat_info, bat_vertices, bat_axes, bat_counts) = geometry
+    radius1, radius2 = params[RADIUS1], params[RADIUS2]
+    big = int(params[BIG_BALL_INDEX])
+    big_radius = bumpers[big, 2]
+
+    # Ball2 may start, or comes into play
+    if state[BALL2_HERE] != 0 and state[STARTER1] == 0 and speed(state, BALL2) <= 1:
+        state[STARTER2] = 1
+    if bounce(state, BALL1, radius1, state[BIG_BALL], state[BIG_BALL + 1], big_radius, events):
+        state[BALL2_HERE] = 1
+        state[BALL2_TIME_BEGIN] = state[TICKS]
+    if state[TICKS] - state[BALL2_TIME_BEGIN] > 20000:
+        state[BALL2_HERE] = bounce(state, BALL1, radius1, state[BIG_BALL], state[BIG_BALL + 1], big_radius, events)
+
+    # Table.handle_inputs()
+    if inputs & LAUNCH:
+        if state[STARTER1] != 0 or state[STARTER2] != 0:
+            state[BATS + 8 + 2] = 0
+            events[0] += 1
+        launch = -params[LAUNCH_SPEED] * params[FPS_MULTIPLYER] * 1.1
+        if state[STARTER1] != 0:
+            state[BALL1 + 2], state[BALL1 + 3] = 0.0, launch
+            state[STARTER1] = 0
+        if state[STARTER2] != 0:
+            state[BALL2 + 2], state[BALL2 + 3] = 0.0, launch
+            state[STARTER2] = 0
+    if inputs & LEFT:
+        state[BATS + 2] = 0
+    if inputs & RIGHT:
+        state[BATS + 4 + 2] = 0
+    if inputs & RESET:
+        state[STARTER1] = 1
+        state[STARTER2] = 0
+        new_round(state)
+        events[3] += 1
+
+    for k in range(3):
+        flip(state, k, bat_info)
+
+    balls = 2 if state[BALL2_HERE] != 0 else 1
+    for b in range(balls):
+        ball = BALL1 if b == 0 else BALL2
+        radius = radius1 if b == 0 else radius2
+
+        # Score penalty for slow balls
+        if speed(state, ball) < 1 * params[FPS_MULTIPLYER]:
+            if state[TICKS] % 5000 <= 3:
+                state[SCORE] -= 1
+
+        for k in range(2):
+            pose = int(state[BATS + 4 * k]) - bat_info[k, 0]
+            hit, nx, ny = circle_sat(state[ball], state[ball + 1], radius, bat_vertices[k, pose], 4,
+                                     bat_axes[k, pose], bat_counts[k, pose])
+            if hit:
+                hit_bat(state, ball, k, nx, ny, params[BAT_COS + k], params[BAT_SIN + k])
+
+    move_objects(state, params, obstacle_vertices, obstacle_axes, obstacle_counts, bumpers)
+
+    if state[BALL2_HERE] != 0:
+        collide_balls(state, radius1, radius2)
+    else:
+        reset_ball(state, BALL2)
+
+    width, height = params[WIDTH], params[HEIGHT]
+    for b in range(balls):
+        ball = BALL1 if b == 0 else BALL2
+        radius = radius1 if b == 0 else radius2
+        move_discrete(state, ball, radius, params, events, obstacle_vertices, obstacle_axes, obstacle_counts, bumpers)
+
+        if speed(state, ball) > 10:
+            state[ball + 2] *= 0.7
+            state[ball + 3] *= 0.7
+
+        if (abs(state[ball] - width / 2) < (width - 2 * params[HOLE_W]) / 2
+                and height - state[ball + 1] < 200):
+            if height - state[ball + 1] < 1:
+                state[LAST_DRAIN], state[LAST_DRAIN + 1] = state[ball], state[ball + 1]
+                check_screen_collide(state, ball, radius, width, height - params[HOLE_H], params[DAMP], params[ROLL])
+                state[STARTER1] = 1
+                state[STARTER2] = 1
+                new_round(state)
+                events[2] += 1
+        else:
+            check_screen_collide(state, ball, radius, width, height - params[HOLE_H], params[DAMP], params[ROLL])
+
+    state[RECORDED] = state[SCORE]
+    state[FRAME] += 1
+    state[TICKS] += params[STEP_MS]
+
+
+@jit
+def run_frames(state, inputs, events, trajectory, params, geometry):
+    '''
+    step_frame() for every entry of inputs, counts the events and fills the
+    rows of trajectory (if it has one row per frame).
+    '''
+    record = trajectory.shape[0] == inputs.shape[0]
+    for frame in range(inputs.shape[0]):
+        step_frame(state, inputs[frame], params, events, geometry)
+        if record:
+            for i in range(8):
+                trajectory[frame, i] = state[BALL1 + i]
+            trajectory[frame, 8] = state[SCORE]
+            trajectory[frame, 9] = state[ROUNDNR]
+
+
+def record(table, frames, policy):
+    '''
+    Plays a table with the reference backend and records the inputs.
+
+    Returns:
+        inputs (ndarray of int, shape (frames,)), trajectory (ndarray, shape (frames, 10))
+    '''
+    inputs = np.zeros(frames, dtype=np.int64)
+    trajectory = np.empty((frames, len(TRAJECTORY)))
+    for frame in range(frames):
+        inputs[frame] = policy(table)
+        table.step(int(inputs[frame]))
+        trajectory[frame] = observe(table)
+    return inputs, trajectory
+
+
+def cross_check(backend, inputs, trajectory, tolerance=1e-6):
+    '''
+    Runs a backend on recorded inputs and compares its trajectory with the recorded one.
+
+    Parameters:
+        backend: A loaded backend, in the state the recording started from.
+        inputs, trajectory (ndarray): A recording, see record().
+        tolerance (float): Largest allowed difference of a position or velocity.
+
+    Returns:
+        frame (int): First frame where the backend leaves the recording (or the score
+            or round differ), None if it agrees on the whole recording.
+        deviation (float): Largest difference of a position or velocity up to that frame.
+    '''
+    result = backend.run(inputs)
+    deviations = np.abs(result[:, :8] - trajectory[:, :8]).max(axis=1)
+    wrong = (deviations > tolerance) | (result[:, 8:] != trajectory[:, 8:]).any(axis=1)
+    frame = int(np.argmax(wrong)) if wrong.any() else None
+    return frame, float(deviations[:frame].max(initial=0.0))
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    from engine import Table, autoplay
+
+    parser = argparse.ArgumentParser(description='Compares the physics backends on a recording.')
+    parser.add_argument('--frames', type=int, default=20000, help='frames to record with autoplay')
+    parser.add_argument('--replay', help='compare on the inputs of a replay file instead')
+    parser.add_argument('--tolerance', type=float, default=1e-6)
+    args = parser.parse_args()
+
+    if args.replay:
+        from replay import Replay
+        replay = Replay(args.replay)
+        new_table = lambda: replay.seek(0)
+        inputs = np.frombuffer(bytes(replay.inputs()), dtype=np.uint8).astype(np.int64)
+        begin = time.perf_counter()
+        trajectory = ReferenceBackend(replay.seek(0)).run(inputs)
+    else:
+        new_table = Table
+        begin = time.perf_counter()
+        inputs, trajectory = record(Table(), args.frames, autoplay)
+    elapsed = time.perf_counter() - begin
+    print(f'{len(inputs)} frames recorded with the reference backend in {elapsed:.2f} s')
+
+    candidates = [('kernel as Python', lambda table: NumbaBackend(table, compiled=False))]
+    if numba is not None:
+        candidates.append(('numba', NumbaBackend))
+    else:
+        print('Numba is not installed, load() gives the reference backend')
+    failed = False
+    for name, make in candidates:
+        backend = make(new_table())
+        if name == 'numba':
+            backend.run(inputs[:1], trajectory=False)  # Compile before timing
+            backend = make(new_table())
+        begin = time.perf_counter()
+        frame, deviation = cross_check(backend, inputs, trajectory, args.tolerance)
+        elapsed = time.perf_counter() - begin
+        verdict = 'agrees' if frame is None else f'differs from frame {frame} on'
+        print(f'{name}: {verdict}, largest difference {deviation:.2e} ({elapsed:.2f} s)')
+        failed |= frame is not None
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,196 @@
+import numpy as np
+
+from classes import Ball, Vector
+
+
+class BallArray:
+    '''
+    Struct-of-arrays store for many balls.
+
+    Positions, velocities, radii and gravity of all balls live in contiguous
+    NumPy arrays, so integration, wall damping/rolling resistance and the
+    velocity cap run as one vectorized operation over every ball instead of
+    one Ball method call per ball. The formulas are the same as in
+    Ball.gravitate and Ball.check_screen_collide.
+
+    Attributes:
+        position (ndarray, shape (n, 2)): Ball positions.
+        velocity (ndarray, shape (n, 2)): Ball velocities.
+        radius (ndarray, shape (n,)): Ball radii.
+        grav (ndarray, shape (n, 2)): Gravity per ball.
+    '''
+
+    def __init__(self, capacity=16):
+        self.count = 0
+        self._position = np.zeros((capacity, 2))
+        self._velocity = np.zeros((capacity, 2))
+        self._radius = np.zeros(capacity)
+        self._grav = np.zeros((capacity, 2))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def position(self):
+        return self._position[:self.count]
+
+    @property
+    def velocity(self):
+        return self._velocity[:self.count]
+
+    @property
+    def radius(self):
+        return self._radius[:self.count]
+
+    @property
+    def grav(self):
+        return self._grav[:self.count]
+
+    def add(self, position, velocity, radius, grav=(0.0, 0.1)):
+        '''
+        Adds a ball and returns its index.
+        Position, velocity and grav are (x, y) pairs or Vectors.
+        '''
+        if self.count == len(self._radius):
+            self._grow()
+        i = self.count
+        self._position[i] = _pair(position)
+        self._velocity[i] = _pair(velocity)
+        self._radius[i] = radius
+        self._grav[i] = _pair(grav)
+        self.count += 1
+        return i
+
+    def _grow(self):
+        capacity = 2 * max(1, len(self._radius))
+        for name in ('_position', '_velocity', '_radius', '_grav'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:])
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    @classmethod
+    def from_balls(cls, balls):
+        '''
+        Builds a store from a list of Ball objects.
+        '''
+        store = cls(max(1, len(balls)))
+        for ball in balls:
+            store.add(ball.position, ball.velocity, ball.radius, ball.grav)
+        return store
+
+    def to_balls(self, balls):
+        '''
+        Writes the state back into a list of Ball objects (same order as from_balls).
+        '''
+        for ball, position, velocity in zip(balls, self.position, self.velocity):
+            ball.position = Vector(float(position[0]), float(position[1]))
+            ball.velocity = Vector(float(velocity[0]), float(velocity[1]))
+
+    def ball(self, i, sc=None):
+        '''
+        Returns a copy of ball i as a Ball object, e.g. for drawing.
+        '''
+        return Ball(sc, Vector(*self.position[i]), Vector(*self.velocity[i]),
+                    float(self.radius[i]), grav=Vector(*self.grav[i]))
+
+    def gravitate(self, DT=0.7):
+        '''
+        Integrates all balls, see Ball.gravitate.
+        '''
+        grav = self.grav
+        self.velocity[:] += grav * (DT * 0.5)
+        self.position[:] += self.velocity * DT + grav * (DT**2 * 0.5)
+
+    def check_screen_collide(self, borders, damp=0.8, roll=0.995, mask=None):
+        '''
+        Reflects all balls at the screen borders, see Ball.check_screen_collide.
+
+        Parameters:
+            borders (Vector): Width and ground level of the screen.
+            mask (ndarray of bool): Only these balls are checked (e.g. not above a hole).
+        '''
+        x, y = self.position[:, 0], self.position[:, 1]
+        vx, vy = self.velocity[:, 0], self.velocity[:, 1]
+        r = self.radius
+        active = np.ones(self.count, dtype=bool) if mask is None else mask
+
+        hit = active & (y > borders.y - r)
+        y[hit] = borders.y - r[hit] + 1
+        vy[hit] *= -damp
+        vx[hit] *= roll         # Rollwiderstand
+
+        hit = active & (y < r)
+        y[hit] += 1
+        vy[hit] *= -damp
+
+        hit = active & (x > borders.x - r)
+        x[hit] -= 1
+        vx[hit] *= -damp
+
+        hit = active & (x < r)
+        x[hit] += 1
+        vx[hit] *= -damp
+
+    def cap_velocity(self, limit=10, factor=0.7):
+        '''
+        Slows down every ball that is faster than limit.
+        '''
+        fast = np.einsum('ij,ij->i', self.velocity, self.velocity) > limit * limit
+        self.velocity[fast] *= factor
+
+    def over_hole(self, width, height, hole_w):
+        '''
+        Returns a mask of the balls that are above the gap between the two holes
+        (same test as in Table.step).
+        '''
+        x, y = self.position[:, 0], self.position[:, 1]
+        return (np.abs(x - width / 2) < (width - 2 * hole_w) / 2) & (height - y < 200)
+
+    def step(self, borders, width, height, hole_w, DT=0.7):
+        '''
+        One frame for all balls: integration, velocity cap and screen borders.
+
+        Returns:
+            drained (ndarray of int): Indices of the balls that fell through the gap.
+        '''
+        self.gravitate(DT)
+        self.cap_velocity()
+        over_hole = self.over_hole(width, height, hole_w)
+        self.check_screen_collide(borders, mask=~over_hole)
+        return np.flatnonzero(over_hole & (height - self.position[:, 1] < 1))
+
+
+def _pair(value):
+    if isinstance(value, Vector):
+        return value.x, value.y
+    return value
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    frames = 2000
+    borders = Vector(600, 700)
+
+    balls = [Ball(None, Vector(50 + i % 500, 100 + i % 400), Vector(1, 0), 10) for i in range(n)]
+    begin = time.perf_counter()
+    for _ in range(frames):
+        for ball in balls:
+            ball.gravitate()
+            if ball.velocity.abs() > 10:
+                ball.velocity = ball.velocity * 0.7
+            ball.check_screen_collide(borders)
+    objects = (time.perf_counter() - begin) / frames
+
+    store = BallArray.from_balls([Ball(None, Vector(50 + i % 500, 100 + i % 400), Vector(1, 0), 10) for i in range(n)])
+    begin = time.perf_counter()
+    for _ in range(frames):
+        store.gravitate()
+        store.cap_velocity()
+        store.check_screen_collide(borders)
+    arrays = (time.perf_counter() - begin) / frames
+
+    print(f'{n} balls: Ball objects {objects * 1e6:.0f} us/frame, BallArray {arrays * 1e6:.0f} us/frame')
@@ -0,0 +1,69 @@
+"""
+Counts the Vector objects created per frame of the headless table.
+
+    python benchmarks/bench_alloc.py [frames]
+
+Every Vector operation that does not work in place allocates a new object,
+so the number of Vector constructions per frame is the garbage the hot loop
+produces. The script also prints the memory footprint of a single Vector.
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import classes
+from engine import Table, autoplay
+
+
+class count_vectors:
+    '''
+    Context manager that counts the calls of Vector.__init__.
+    '''
+
+    def __enter__(self):
+        self.count = 0
+        self._init = classes.Vector.__init__
+        init = self._init
+
+        def counting_init(vector, *args):
+            self.count += 1
+            init(vector, *args)
+
+        classes.Vector.__init__ = counting_init
+        return self
+
+    def __exit__(self, *exc):
+        classes.Vector.__init__ = self._init
+
+
+def vector_size():
+    '''
+    Bytes of one Vector including its instance dict (if it has one).
+    '''
+    vector = classes.Vector(1.0, 2.0)
+    size = sys.getsizeof(vector)
+    if hasattr(vector, '__dict__'):
+        size += sys.getsizeof(vector.__dict__)
+    return size
+
+
+def main(frames=5000):
+    table = Table()
+    for _ in range(200):
+        table.step(autoplay(table))
+
+    with count_vectors() as counter:
+        begin = time.perf_counter()
+        for _ in range(frames):
+            table.step(autoplay(table))
+        elapsed = time.perf_counter() - begin
+
+    print(f'Vector allocations per frame: {counter.count / frames:.1f}')
+    print(f'Bytes per Vector:             {vector_size()}')
+    print(f'Time per frame:               {elapsed / frames * 1e6:.0f} us (with counting)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
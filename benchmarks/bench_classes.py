@@ -0,0 +1,232 @@
+"""
+Microbenchmarks of the per-frame primitives in classes.py.
+
+    python benchmarks/bench_classes.py                      # print ns/op, allocated bytes/op and Vectors/op
+    python benchmarks/bench_classes.py --save base.json     # store the results as baseline
+    python benchmarks/bench_classes.py --compare base.json  # exit code 1 on a regression
+
+Every case is timed as the best of several repeats, so the result is the
+cost of the operation itself and not of whatever else the machine does.
+Allocations are measured twice. tracemalloc gives the memory a call
+allocates on top of what was there before it, at its peak, so the lists,
+tuples and dicts built on the way count as well as the Vectors. The second
+number is the count of Vector objects created per call (see bench_alloc.py).
+Neither depends on the machine, so any increase counts as a regression,
+while the time may grow by --tolerance before it does.
+
+Cases that change their objects (a hit moves the ball) put the objects
+back at the start of every call; that cost is part of the result.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+# No window and no sound card needed
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench_alloc import count_vectors
+from classes import Ball, Rect, Triangle, Vector
+from engine import Table
+
+
+def vector_cases():
+    a = Vector(3.0, 4.0)
+    b = Vector(1.5, -2.5)
+    c = Vector(3.0, 4.0)
+
+    def iadd():
+        c.__iadd__(b)
+
+    def imul():
+        c.__imul__(1.0)
+
+    return {'Vector.__add__': lambda: a + b,
+            'Vector.__sub__': lambda: a - b,
+            'Vector.__mul__': lambda: a * 2.0,
+            'Vector.__truediv__': lambda: a / 2.0,
+            'Vector.__iadd__': iadd,
+            'Vector.__imul__': imul,
+            'Vector.add_scaled': lambda: c.add_scaled(b, 0.0),
+            'Vector.dot': lambda: a.dot(b),
+            'Vector.abs': lambda: a.abs(),
+            'Vector.rotate': lambda: a.rotate(30),
+            'Vector.normalize': lambda: a.normalize(),
+            'Vector.normalize_ip': lambda: c.normalize_ip()}
+
+
+def ball_cases():
+    ball = Ball(None, Vector(300, 300), Vector(1, 0), 10)
+    big_ball = Ball(None, Vector(300, 300), Vector(0, 0), 30, grav=Vector(0, 0))
+    far = Ball(None, Vector(100, 100), Vector(1, 0), 10)
+
+    def gravitate():
+        ball.gravitate()
+
+    def collision_hit():
+        far.position.x = 310
+        far.position.y = 300
+        far.velocity.x = 1
+        far.velocity.y = 0
+        far.check_collision(big_ball)
+
+    def collision_miss():
+        ball.position.x = 100
+        ball.position.y = 100
+        ball.check_collision(big_ball)
+
+    return {'Ball.gravitate': gravitate,
+            'Ball.check_collision (hit)': collision_hit,
+            'Ball.check_collision (miss)': collision_miss}
+
+
+def bat_cases():
+    table = Table()
+    cases = {}
+    for name, bat in (('left', table.left_bat), ('right', table.right_bat)):
+        ball = Ball(None, Vector(0, 0), Vector(0, 3), 10)
+        # Just above the middle of the bat: inside its bounding box, hit or not depending on the height
+        x = (bat.points_vec[0].x + bat.points_vec[1].x) / 2
+
+        def sat_hit(ball=ball, bat=bat, x=x):
+            ball.position.x = x
+            ball.position.y = 715
+            ball.velocity.x = 0
+            ball.velocity.y = 3
+            ball.sat_algo(bat.points_tuple, bat)
+
+        def sat_miss(ball=ball, bat=bat, x=x):
+            ball.position.x = x
+            ball.position.y = 690
+            ball.sat_algo(bat.points_tuple, bat)
+
+        def flip(bat=bat):
+            # Keep the bat swinging instead of letting it come to rest
+            bat.count = 0
+            bat.flip()
+
+        cases[f'Ball.sat_algo {name} bat (hit)'] = sat_hit
+        cases[f'Ball.sat_algo {name} bat (miss)'] = sat_miss
+        cases[f'Bat.flip {name}'] = flip
+    return cases
+
+
+def shape_cases():
+    rect = Rect(Vector(300, 400), 100, 20)
+    triangle = Triangle(Vector(0, 0), Vector(60, 0), Vector(0, 60))
+    inside = Ball(None, Vector(350, 405), Vector(0, 0), 10)
+    outside = Ball(None, Vector(200, 200), Vector(0, 0), 10)
+    corner = Ball(None, Vector(15, 15), Vector(0, 0), 10)
+    return {'Rect.is_collision (hit)': lambda: rect.is_collision(inside),
+            'Rect.is_collision (miss)': lambda: rect.is_collision(outside),
+            'Triangle.is_collision (hit)': lambda: triangle.is_collision(corner),
+            'Triangle.is_collision (miss)': lambda: triangle.is_collision(outside)}
+
+
+def all_cases():
+    cases = {}
+    for group in (vector_cases, ball_cases, bat_cases, shape_cases):
+        cases.update(group())
+    return cases
+
+
+def measure(function, number=5000, repeat=15):
+    '''
+    Returns (ns per call, allocated bytes per call, Vector allocations per call).
+    '''
+    best = None
+    for _ in range(repeat):
+        begin = time.perf_counter_ns()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter_ns() - begin
+        if best is None or elapsed < best:
+            best = elapsed
+
+    calls = 1000
+    allocated = traced_peak(function, calls)
+
+    with count_vectors() as counter:
+        for _ in range(calls):
+            function()
+    return best / number, allocated, counter.count / calls
+
+
+def traced_peak(function, calls):
+    '''
+    Returns the median over calls of the peak memory allocated during one call (tracemalloc).
+    The median ignores one-off allocations such as filling a cache.
+    '''
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(calls):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            function()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return statistics.median(peaks)
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Returns the lines of all regressions against a baseline.
+    '''
+    regressions = []
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        if result['ns'] > base['ns'] * (1 + tolerance):
+            regressions.append(f"{name}: {result['ns']:.0f} ns/op, baseline {base['ns']:.0f} ns/op")
+        for key, unit in (('bytes', 'B/op'), ('vectors', 'Vectors/op')):
+            if key in base and result[key] > base[key] + 1e-9:
+                regressions.append(f"{name}: {result[key]:g} {unit}, baseline {base[key]:g} {unit}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks of classes.py.')
+    parser.add_argument('--number', type=int, default=5000, help='calls per repeat')
+    parser.add_argument('--filter', default='', help='only cases whose name contains this text')
+    parser.add_argument('--save', metavar='FILE', help='write the results as JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare with a JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown')
+    args = parser.parse_args()
+
+    results = {}
+    for name, function in all_cases().items():
+        if args.filter not in name:
+            continue
+        ns, allocated, vectors = measure(function, args.number)
+        results[name] = {'ns': ns, 'bytes': allocated, 'vectors': vectors}
+        print(f'{name:36} {ns:8.0f} ns/op {allocated:6.0f} B/op {vectors:6.2f} Vectors/op')
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results},
+                      file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print('REGRESSION', line)
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions against {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Startup benchmark: time from a cold interpreter to the name-entry screen.
+
+    python benchmarks/bench_startup.py                  # import profile and time to the name screen
+    python benchmarks/bench_startup.py --budget 800     # exit code 1 if it takes longer than 800 ms
+
+Two measurements, each in fresh interpreters:
+
+1. `python -X importtime -c "import main"` gives the import time of every
+   module on the launch path. The slowest modules are listed, and modules
+   that must stay off that path (--forbid, e.g. pandas or numpy.random)
+   count as a failure as soon as they show up.
+2. A probe runs main.main() itself, so everything the game does before
+   the name screen is timed: loading the layout (hash and cache), opening
+   the window in the layout size and starting the asset worker. A RETURN
+   key is queued when start_screen() comes up, and the probe ends as soon
+   as the name screen was drawn and left. Its wall time, from starting the
+   interpreter until then, is compared to --budget (median of --runs runs).
+
+The window uses the dummy video driver, so the benchmark runs without a
+display. The probe runs in an empty temporary folder, so the highscore
+database the asset worker opens does not end up in the repository.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Modules that are not needed before the name screen
+FORBIDDEN = ('pandas', 'numpy.random', 'sqlite3', 'replay')
+
+PROBE = '''
+import os
+import pygame
+import main
+
+start_screen = main.start_screen
+
+def name_screen(screen, texts=None):
+    pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RETURN, unicode='\\r'))
+    start_screen(screen, texts)
+    # Done: leave without waiting for the asset worker or tearing down pygame
+    os._exit(0)
+
+main.start_screen = name_screen
+main.main()
+'''
+
+
+def environment():
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy', PYGAME_HIDE_SUPPORT_PROMPT='1')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(ROOT), env.get('PYTHONPATH')]))
+    return env
+
+
+def import_times():
+    '''
+    Runs `import main` with -X importtime.
+
+    Returns:
+        modules (list of (name, self_us, cumulative_us)): In import order.
+    '''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=ROOT,
+                            env=environment(), capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative)))
+    return modules
+
+
+def time_to_name_screen():
+    '''
+    Returns the wall time in ms from starting an interpreter until main.main() has shown the name screen.
+    '''
+    with tempfile.TemporaryDirectory() as folder:
+        begin = time.perf_counter()
+        subprocess.run([sys.executable, '-c', PROBE], cwd=folder, env=environment(), check=True,
+                       stdout=subprocess.DEVNULL)
+        return (time.perf_counter() - begin) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time from a cold start to the name-entry screen.')
+    parser.add_argument('--runs', type=int, default=5, help='probe runs, the median counts')
+    parser.add_argument('--budget', type=float, default=1000, help='allowed ms until the name screen')
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to list')
+    parser.add_argument('--forbid', default=','.join(FORBIDDEN),
+                        help='comma separated modules that must not be imported by main')
+    args = parser.parse_args()
+
+    modules = import_times()
+    total = next(cumulative for name, _, cumulative in modules if name == 'main')
+    print(f'import main: {total / 1000:.1f} ms')
+    print(f"{'module':40} {'self ms':>8} {'cumul. ms':>10}")
+    for name, self_us, cumulative in sorted(modules, key=lambda module: -module[1])[:args.top]:
+        print(f'{name:40} {self_us / 1000:8.1f} {cumulative / 1000:10.1f}')
+
+    failures = []
+    imported = {name for name, _, _ in modules}
+    for name in filter(None, args.forbid.split(',')):
+        if name in imported:
+            failures.append(f'{name} is imported on the launch path')
+
+    times = [time_to_name_screen() for _ in range(args.runs)]
+    median = statistics.median(times)
+    print(f'\nname screen after {median:.0f} ms (median of {args.runs}, min {min(times):.0f}, '
+          f'max {max(times):.0f}), budget {args.budget:.0f} ms')
+    if median > args.budget:
+        failures.append(f'name screen after {median:.0f} ms, budget {args.budget:.0f} ms')
+
+    for failure in failures:
+        print('FAIL', failure)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+class UniformGrid:
+    '''
+    Broadphase for table objects: a uniform grid of square cells.
+
+    Every object is stored with its axis aligned bounding box (AABB) in all
+    cells the box touches. A query only looks at the cells around the ball,
+    so the cost of finding collision candidates depends on how many objects
+    are near the ball and not on how many objects the table has.
+
+    Objects get a handle (their insertion index) when they are inserted.
+    Queries return the handles in insertion order, so the narrowphase visits
+    candidates in the same order as a plain loop over all objects would.
+
+    An AABB is a tuple (min_x, min_y, max_x, max_y).
+    '''
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}      # (column, row) -> list of handles
+        self.objects = []    # handle -> object
+        self.boxes = []      # handle -> AABB
+        self.ranges = []     # handle -> range of cells covered by the AABB
+
+    def __len__(self):
+        return len(self.objects)
+
+    def cell_range(self, aabb):
+        '''
+        Returns the first and last column and row touched by an AABB.
+        '''
+        size = self.cell_size
+        min_x, min_y, max_x, max_y = aabb
+        return int(min_x // size), int(min_y // size), int(max_x // size), int(max_y // size)
+
+    def insert(self, obj, aabb):
+        '''
+        Adds an object and returns its handle.
+        '''
+        handle = len(self.objects)
+        self.objects.append(obj)
+        self.boxes.append(aabb)
+        cells = self.cell_range(aabb)
+        self.ranges.append(cells)
+        self._add(handle, cells)
+        return handle
+
+    def update(self, handle, aabb):
+        '''
+        Moves an object to a new AABB. The cells are only touched if the
+        object left its cell range, so slow movers are cheap to update.
+        '''
+        self.boxes[handle] = aabb
+        cells = self.cell_range(aabb)
+        if cells != self.ranges[handle]:
+            self._remove(handle, self.ranges[handle])
+            self._add(handle, cells)
+            self.ranges[handle] = cells
+
+    def query(self, aabb, after=-1):
+        '''
+        Returns the handles of all objects whose AABB overlaps the given AABB.
+
+        Parameters:
+            aabb (tuple): Area to search.
+            after (int): Only handles greater than this are returned.
+
+        Returns:
+            handles (list of int): In insertion order.
+        '''
+        min_x, min_y, max_x, max_y = aabb
+        first_col, first_row, last_col, last_row = self.cell_range(aabb)
+        cells = self.cells
+        boxes = self.boxes
+        found = set()
+        for column in range(first_col, last_col + 1):
+            for row in range(first_row, last_row + 1):
+                for handle in cells.get((column, row), ()):
+                    if handle > after and handle not in found:
+                        box = boxes[handle]
+                        if box[0] <= max_x and box[2] >= min_x and box[1] <= max_y and box[3] >= min_y:
+                            found.add(handle)
+        return sorted(found)
+
+    def _add(self, handle, cells):
+        first_col, first_row, last_col, last_row = cells
+        for column in range(first_col, last_col + 1):
+            for row in range(first_row, last_row + 1):
+                self.cells.setdefault((column, row), []).append(handle)
+
+    def _remove(self, handle, cells):
+        first_col, first_row, last_col, last_row = cells
+        for column in range(first_col, last_col + 1):
+            for row in range(first_row, last_row + 1):
+                cell = self.cells[(column, row)]
+                cell.remove(handle)
+                if not cell:
+                    del self.cells[(column, row)]
@@ -1,7 +1,8 @@
 import pygame
 from copy import copy
 import math
-import numpy as np
+
+from collision import circle_sat, polygon_axes
 
 colors = {'white': (255, 255, 255),
           'black': (0, 0, 0),
@@ -13,6 +14,12 @@ class Vector:
     """
     Eine Klasse, die einen Vektor in 2 Dimensionen repräsentiert.
 
+    Die Operatoren +, -, * und / geben immer einen neuen Vektor zurück.
+    +=, -=, *= und /= sowie add_scaled() und normalize_ip() ändern den Vektor
+    selbst und erzeugen keine neuen Objekte; sie sind für die Physik pro Frame
+    gedacht. Vorsicht: Vektoren, die an mehreren Stellen benutzt werden, dürfen
+    nicht in-place verändert werden.
+
     Attribute:
         x : float oder int
         y : float oder int
@@ -21,19 +28,24 @@ class Vector:
         __init__(self, x, y)
         __str__(self)
         __add__(self, other)
+        __iadd__(self, other)
         __sub__(self, other)
+        __isub__(self, other)
         __mul__(self, other)
+        __imul__(self, scalar)
         __truediv__(self, scalar)
+        __itruediv__(self, scalar)
+        add_scaled(self, other, scalar)
         abs(self)
         rotate(self, angle)
         int_tuple(self)
-        angle(self)
-        cross(self, other)
         dot(self, other)
-        length(self)
         normalize(self)
+        normalize_ip(self)
     """
 
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         """
         Initialisiere eine neue Instanz eines Vektors
@@ -41,6 +53,12 @@ class Vector:
         self.x = x  # Setze die x-Komponente des Vektors
         self.y = y  # Setze die y-Komponente des Vektors
 
+    def __reduce__(self):
+        """
+        Pickle als Vector(x, y), kleiner und schneller geladen als der Zustand der Slots
+        """
+        return Vector, (self.x, self.y)
+
     def __str__(self):
         """
         Gibt eine Zeichenfolge für den Vektor als "Vector(x,y,z)" zurück
@@ -54,15 +72,35 @@ class Vector:
         """
         return Vector(self.x + other.x, self.y + other.y)
 
+    def __iadd__(self, other):
+        """
+        Überlade den += Operator, addiert other in-place
+        """
+        self.x += other.x
+        self.y += other.y
+        return self
+
     def __sub__(self, other):
         """
         Überlade den - Operator für die Vector-Klasse
         Implementiert die Subtraktion von zwei Instanzen der Vector-Klasse
         """
-        if isinstance(other, self.__class__):
+        if isinstance(other, Vector):
             return Vector(self.x - other.x, self.y - other.y)
         return Vector(self.x - other, self.y - other)
 
+    def __isub__(self, other):
+        """
+        Überlade den -= Operator, subtrahiert other in-place
+        """
+        if isinstance(other, Vector):
+            self.x -= other.x
+            self.y -= other.y
+        else:
+            self.x -= other
+            self.y -= other
+        return self
+
     def __mul__(self, other):
         """ 
         Überlade den * Operator für die Vector-Klasse
@@ -72,11 +110,16 @@ class Vector:
               Gibt einen Vektor zurück, dessen Komponenten mit dem Wert multipliziert sind
         """
         if isinstance(other, Vector):
-            return self.mul_vector(other)
-        if isinstance(other, float):
-            return self.mul_scalar(other)
-        if isinstance(other, int):
-            return self.mul_scalar(other)
+            return float(self.x * other.x + self.y * other.y)
+        return Vector(self.x * other, self.y * other)
+
+    def __imul__(self, scalar):
+        """
+        Überlade den *= Operator, multipliziert in-place mit einem Skalar
+        """
+        self.x *= scalar
+        self.y *= scalar
+        return self
 
     def mul_vector(self, other):
         """
@@ -97,20 +140,36 @@ class Vector:
         """
         return Vector(self.x / scalar, self.y / scalar)
 
+    def __itruediv__(self, scalar):
+        """
+        Überlade den /= Operator, dividiert in-place durch einen Skalar
+        """
+        self.x /= scalar
+        self.y /= scalar
+        return self
+
+    def add_scaled(self, other, scalar):
+        """
+        Addiert other * scalar in-place (self += other * scalar ohne Zwischenvektor)
+        """
+        self.x += other.x * scalar
+        self.y += other.y * scalar
+        return self
+
     def abs(self):
         """
         Gibt den Betrag des Vektor-Objekts zurück
         """
-        return float(np.sqrt((self.x * self.x + self.y * self.y)))
+        return math.sqrt(self.x * self.x + self.y * self.y)
 
     def rotate(self, angle):
         """
-        Dreht den Vektor um einen gegebenen Winkel im Bogenmaß
+        Dreht den Vektor um einen gegebenen Winkel in Grad
         """
         angle_radians = math.radians(angle)
-        new_x = self.x * math.cos(angle_radians) - self.y * math.sin(angle_radians)
-        new_y = self.x * math.sin(angle_radians) + self.y * math.cos(angle_radians)
-        return Vector(new_x, new_y)
+        cos = math.cos(angle_radians)
+        sin = math.sin(angle_radians)
+        return Vector(self.x * cos - self.y * sin, self.x * sin + self.y * cos)
 
     def int_tuple(self):
         """
@@ -126,19 +185,26 @@ class Vector:
 
     def normalize(self):
         """
-        Normalisiert den Vektor
+        Gibt den normierten Vektor als neuen Vektor zurück (der Nullvektor bleibt Nullvektor)
+        """
+        length = self.abs()
+        if length != 0:
+            return Vector(self.x / length, self.y / length)
+        return Vector(0,0)
+
+    def normalize_ip(self):
+        """
+        Normalisiert den Vektor in-place (der Nullvektor bleibt Nullvektor)
         """
         length = self.abs()
         if length != 0:
             self.x /= length
             self.y /= length
-        else:
-            return Vector(0,0)
-        return Vector(self.x, self.y)
+        return self
      
 class Bat:
     
-    def __init__(self, screen, color, points, angle=0, direction=1, count=0, active=1, right=False, anschlag = 50):
+    def __init__(self, screen, color, points, angle=0, direction=1, count=0, active=1, right=False, anschlag = 50, poses=None):
         '''
         Constructor for the Bat class. 
         
@@ -150,6 +216,8 @@ class Bat:
             right (bool): For right swinging bats.
             points_vec: Only for calculation
             points_tuple: Only for drawing
+            poses (dict): Precomputed pose for every reachable angle, see pose().
+                Can be passed in (e.g. from a compiled layout), missing angles are computed.
         '''
         # Initialize instance variables
         self.screen = screen
@@ -171,6 +239,68 @@ class Bat:
         else:
             self.right = 1
 
+        self.axes = polygon_axes(self.points_tuple)
+
+        # The angle only moves in steps of 1 degree between the two stops,
+        # so every pose of the bat can be computed once here
+        stops = (-self.anschlag * self.right, 20 * self.right, angle)
+        self.poses = dict(poses) if poses else {}
+        for pose_angle in range(min(stops), max(stops) + 1):
+            if pose_angle not in self.poses:
+                self.poses[pose_angle] = self.compute_pose(pose_angle)
+
+    def compute_pose(self, angle):
+        '''
+        Rotates the bat to the given angle.
+
+        Returns:
+            pose (tuple): (rotated_points_vec, rotated_points_tuple, center, axes)
+        '''
+        rotated_points_vec = []
+        rotated_points_tuple = []
+
+        # Rotate the corner points of the bat around the first point
+        pivot_point = self.points_vec[0]
+        for point in self.points_vec:
+            point = (point - pivot_point).rotate(angle) + pivot_point
+            rotated_points_tuple.append(point.int_tuple())
+            rotated_points_vec.append(point)
+
+        (x0, y0), _, (x2, y2), _ = rotated_points_tuple
+        center = Vector((x0 - x2) / 2 + x2, (y0 - y2) / 2 + y2)
+        return rotated_points_vec, rotated_points_tuple, center, polygon_axes(rotated_points_tuple)
+
+    def pose(self, angle):
+        '''
+        Returns the precomputed pose for an angle (computed and stored if it is not reachable by flip()).
+        '''
+        pose = self.poses.get(angle)
+        if pose is None:
+            pose = self.poses[angle] = self.compute_pose(angle)
+        return pose
+
+    def polygon(self):
+        '''
+        Corner points and SAT axes of the current pose, like Rect.polygon().
+        '''
+        return self.points_tuple, self.axes
+
+    def aabb(self):
+        '''
+        Bounding box (min_x, min_y, max_x, max_y) of the current pose.
+        '''
+        xs = [p[0] for p in self.points_tuple]
+        ys = [p[1] for p in self.points_tuple]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def swept_aabb(self):
+        '''
+        Bounding box of all poses in the pose table, i.e. of the whole area the bat can sweep.
+        '''
+        xs = [p[0] for pose in self.poses.values() for p in pose[1]]
+        ys = [p[1] for pose in self.poses.values() for p in pose[1]]
+        return min(xs), min(ys), max(xs), max(ys)
+
     def update(self):
         '''
         Update method to redraw the bat on the screen after rotation.
@@ -185,8 +315,14 @@ class Bat:
             rotated_points_tuple (list of tuples): Rotated corner points of the bat.
         '''
 
+        at_stop = self.angle == -self.anschlag * self.right or self.angle == 20 * self.right
+
+        # Resting bat: nothing changes until count is reset
+        if not at_stop and self.active == 0 and self.count >= 1:
+            return self.points_tuple
+
         # Change rotation direction at specific angles
-        if self.angle == -self.anschlag * self.right or self.angle == 20 * self.right:
+        if at_stop:
             self.direction *= -1
             if self.angle == 20 * self.right:
                 self.count += 1
@@ -194,28 +330,16 @@ class Bat:
         # Update the rotation angle
         self.angle -= 1 * self.direction * self.active
 
-        # Rotate the corner points of the bat
-        rotated_points_vec = []
-        rotated_points_tuple = []
-
-        pivot_point = self.points_vec[0]
-        for point in self.points_vec:
-            point = point - pivot_point 
-            point = point.rotate(self.angle) + pivot_point
-            rotated_points_tuple.append(point.int_tuple())
-            rotated_points_vec.append(point)
-  
         # Update activity based on count
         if self.count >= 1:
             self.active = 0
         else:
             self.active = 1
         
-        # Update instance variables
-        self.points_tuple = rotated_points_tuple
-        self.center = (Vector(self.points_tuple[0][0], self.points_tuple[0][1]) - Vector(self.points_tuple[2][0], self.points_tuple[2][1]))/2 + Vector(self.points_tuple[2][0], self.points_tuple[2][1])
+        # Update instance variables from the pose table
+        _, self.points_tuple, self.center, self.axes = self.pose(self.angle)
         
-        return rotated_points_tuple
+        return self.points_tuple
 
 class Ball:
 
@@ -242,7 +366,12 @@ class Ball:
             self.velocity.x = self.velocity.x * damp * (-1)
             
 
-    def check_collision(self, other: object):
+    def check_collision(self, other: object, events=None):
+        '''
+        Stoß mit einem anderen Ball.
+        Input: other ball, events (list): bekommt 'bumper' bei Stößen mit großen Bällen
+               (der Sound dazu wird von der Darstellung abgespielt, siehe sounds.SoundBank)
+        '''
 
         connecting_vec = other.position - self.position
         distance = connecting_vec.abs()
@@ -258,23 +387,24 @@ class Ball:
             self_v_davor = self.velocity
             other_v_davor = other.velocity 
             #Versatz
-            self.position = self.position - connecting_vec.normalize()      # Klasse Vector versteht nur + und * deswegen diese komische Schreibweise hier. 
+            connecting_vec.normalize_ip()
+            self.position -= connecting_vec
             if not isbigball:
-                other.position = other.position + connecting_vec.normalize()     # verschiebt die Bälle nach dem Stoß um 1 Pixel weg voneinander
+                other.position += connecting_vec     # verschiebt die Bälle nach dem Stoß um 1 Pixel weg voneinander
                 other.velocity = self_v_davor * 0.8
                 self.velocity = other_v_davor * 0.8
 
             if isbigball:
-                sound = pygame.mixer.Sound("sound.wav")
-                pygame.mixer.Sound.play(sound)
-                self.velocity = self.velocity * (-1.1)
+                if events is not None:
+                    events.append('bumper')
+                self.velocity *= -1.1
                 if self.velocity.abs() >= 7:
                     return True            
 
     def gravitate(self,DT=0.7):
 
-        self.velocity = self.velocity + self.grav*DT * 0.5
-        self.position = self.position + self.velocity*DT + self.grav*DT**2*0.5  
+        self.velocity.add_scaled(self.grav, DT * 0.5)
+        self.position.add_scaled(self.velocity, DT).add_scaled(self.grav, DT**2 * 0.5)
     
     def is_object_collision(self, i):
         return i.is_collision(self)[0]
@@ -290,37 +420,18 @@ class Ball:
     
     def sat_algo(self, points, other):
 
-        vec_points = [Vector(point[0], point[1]) for point in points]
-
-        # SAT Beginn
-        vertices = []
-        for index in range(len(vec_points)):
-            vertice = vec_points[index-1] - vec_points[index]
-            vertices.append(vertice)
-        normals = []
-        overlaps = []
-        for vertice in vertices:
-            normal = vertice.rotate(90 * other.right).normalize()
-            normals.append(normal)
-
-            obj_projections = [p.dot(normal) for p in vec_points]
-            ball_projections = [self.position.dot(normal) + 2*self.radius, self.position.dot(normal) - 2*self.radius]
-
-            min_rect = min(obj_projections)
-            max_rect = max(obj_projections)
-            min_ball = min(ball_projections)  # 20 ist ball radius
-            max_ball = max(ball_projections)
-
-            overlap =  min(max_rect, max_ball) - max(min_rect, min_ball)
-            overlaps.append(overlap)
-
-            if max_ball < min_rect or min_ball > max_rect:
-                # Es gibt eine separierende Achse!
-                return False, 0
-
-        # Wenn keine separierende Achse gefunden wurde, gibt es eine Kollision
-        min_overlap = np.argmin(overlaps)
-        self.collide(normals[min_overlap], other)
+        # Kreis gegen Schläger, die Achsen der aktuellen Lage kommen aus der Tabelle des Schlägers
+        if points is other.points_tuple:
+            axes = other.axes
+        else:
+            axes = polygon_axes(points)
+
+        hit, nx, ny, _ = circle_sat(self.position.x, self.position.y, self.radius, points, axes)
+        if not hit:
+            return False
+
+        self.collide(Vector(nx, ny), other)
+        return True
     
     def collide(self, n, other):
         '''
@@ -330,9 +441,22 @@ class Ball:
         boost = other.active * 1
         t = n.rotate(-90 * other.right)
         old_velo = self.velocity
-        new_velo = n * old_velo.dot(n) * (-1) + t * old_velo.dot(t)
-        self.position += new_velo.normalize() * 10
-        self.velocity = new_velo * old_velo.abs() * (1+boost)
+        vn = old_velo.dot(n)
+        vt = old_velo.dot(t)
+        new_velo = Vector(-n.x * vn + t.x * vt, -n.y * vn + t.y * vt)
+        new_velo.normalize_ip()
+        self.position.add_scaled(new_velo, 10)
+        new_velo *= old_velo.abs()
+        new_velo *= 1 + boost
+        self.velocity = new_velo
+
+    def aabb(self, margin=0):
+        '''
+        Bounding box (min_x, min_y, max_x, max_y) of the ball, grown by margin on every side.
+        '''
+        extent = self.radius + margin
+        return (self.position.x - extent, self.position.y - extent,
+                self.position.x + extent, self.position.y + extent)
 
     def reset(self):
         self.position = Vector(20, 660)
@@ -340,7 +464,7 @@ class Ball:
 
 
 class Rect:
-    def __init__(self, position : Vector, width : float, height: float):
+    def __init__(self, position : Vector, width : float, height: float, polygon=None):
         """
         Initialisiert ein Rechteck mit einer Position, Breite und Höhe.
 
@@ -348,10 +472,16 @@ class Rect:
             position (Vector): Die Position des Rechtecks als Vektor.
             width (float or int): Die Breite des Rechtecks.
             height (float or int): Die Höhe des Rechtecks.
+            polygon (tuple): Vorberechnete Eckpunkte und Achsen (siehe polygon()), z. B. aus layout.py.
         """
         self.position = position  # Die Position des Rechtecks
         self.width = width  # Die Breite des Rechtecks
         self.height = height  # Die Höhe des Rechtecks
+        self._polygon_key = None  # Position und Größe, für die das Polygon berechnet wurde
+        self._polygon = None
+        if polygon is not None:
+            self._polygon_key = (position.x, position.y, width, height)
+            self._polygon = polygon
         fps_multiplyer = 1
 
     def calculate_vertices(self):
@@ -368,43 +498,46 @@ class Rect:
             Vector(self.position.x, self.position.y + self.height)
         ]
 
+    def polygon(self):
+        """
+        Gibt die Eckpunkte des Rechtecks als Tupel und seine SAT-Achsen zurück
+        (siehe collision.polygon_axes()).
+        Sie werden nur neu berechnet, wenn das Rechteck bewegt oder verändert wurde.
+        """
+        key = (self.position.x, self.position.y, self.width, self.height)
+        if key != self._polygon_key:
+            vertices = [(p.x, p.y) for p in self.calculate_vertices()]
+            self._polygon_key = key
+            self._polygon = vertices, polygon_axes(vertices)
+        return self._polygon
+
+    def contact(self, ball):
+        """
+        Kollisionstest mit einem Ball in einem Aufruf.
+
+        Returns:
+            (hit, normal, depth): Kollision ja/nein, die Normale vom Polygon zum Ball
+            und die Eindringtiefe, siehe collision.circle_sat().
+        """
+        vertices, axes = self.polygon()
+        hit, nx, ny, depth = circle_sat(ball.position.x, ball.position.y, ball.radius, vertices, axes)
+        if not hit:
+            return False, 0, 0
+        return True, Vector(nx, ny), depth
+
     def is_collision(self, ball):
-        rect_vertices = self.calculate_vertices()
-        
-        # Erstelle ein Rechteck um den Ball
-        ball_rect = Rect(Vector(ball.position.x - ball.radius, ball.position.y - ball.radius),
-                         ball.radius * 2, ball.radius * 2)
-
-        normals = []
-        overlaps = []
-        for i in range(len(rect_vertices)):
-            edge = rect_vertices[(i + 1) % len(rect_vertices)] - rect_vertices[i]
-            normal = Vector(-edge.y,edge.x).normalize()
-            normals.append(normal)
-
-            # Berechne Projektionen für das Rechteck und das Ball-Rechteck
-            rect_projections = [p.dot(normal) for p in rect_vertices]
-            ball_rect_projections = [p.dot(normal) for p in ball_rect.calculate_vertices()]
-
-            min_rect = min(rect_projections)
-            max_rect = max(rect_projections)
-            min_ball_rect = min(ball_rect_projections * 2)
-            max_ball_rect = max(ball_rect_projections * 2)
-
-            overlap =  min(max_rect, max_ball_rect) - max(min_rect, min_ball_rect)
-            overlaps.append(overlap)
-
-            # Überprüfe die Kollision zwischen dem Ball-Rechteck und dem Rechteck
-            if max_ball_rect < min_rect or min_ball_rect > max_rect:
-                # Es gibt eine separierende Achse!
-                return False, 0
-
-        # Wenn keine separierende Achse gefunden wurde, gibt es eine Kollision
-        min_overlap = (np.argmin(overlaps), np.min(overlaps))
-        return True, normals[min_overlap[0]]
+        hit, normal, _ = self.contact(ball)
+        return hit, normal
+
+    def aabb(self):
+        """
+        Gibt das umgebende Rechteck als (min_x, min_y, max_x, max_y) zurück.
+        """
+        return (self.position.x, self.position.y,
+                self.position.x + self.width, self.position.y + self.height)
 
 class Triangle:
-    def __init__(self, point1, point2, point3):
+    def __init__(self, point1, point2, point3, polygon=None):
         """
         Initialisiert ein Dreieck mit drei Punkten.
 
@@ -412,10 +545,16 @@ class Triangle:
             point1 (Vector): Der erste Punkt des Dreiecks als Vektor.
             point2 (Vector): Der zweite Punkt des Dreiecks als Vektor.
             point3 (Vector): Der dritte Punkt des Dreiecks als Vektor.
+            polygon (tuple): Vorberechnete Eckpunkte und Achsen (siehe polygon()), z. B. aus layout.py.
         """
         self.point1 = point1
         self.point2 = point2
         self.point3 = point3
+        self._polygon_key = None  # Eckpunkte, für die das Polygon berechnet wurde
+        self._polygon = None
+        if polygon is not None:
+            self._polygon_key = (point1.x, point1.y, point2.x, point2.y, point3.x, point3.y)
+            self._polygon = polygon
 
     def calculate_vertices(self):
         """
@@ -426,42 +565,46 @@ class Triangle:
         """
         return [self.point1, self.point2, self.point3]
 
+    def polygon(self):
+        """
+        Gibt die Eckpunkte des Dreiecks als Tupel und seine SAT-Achsen zurück
+        (siehe collision.polygon_axes()).
+        Sie werden nur neu berechnet, wenn ein Eckpunkt verschoben wurde.
+        """
+        key = (self.point1.x, self.point1.y, self.point2.x, self.point2.y, self.point3.x, self.point3.y)
+        if key != self._polygon_key:
+            vertices = [(p.x, p.y) for p in self.calculate_vertices()]
+            self._polygon_key = key
+            self._polygon = vertices, polygon_axes(vertices)
+        return self._polygon
+
+    def contact(self, ball):
+        """
+        Kollisionstest mit einem Ball in einem Aufruf.
+
+        Returns:
+            (hit, normal, depth): Kollision ja/nein, die Normale vom Polygon zum Ball
+            und die Eindringtiefe, siehe collision.circle_sat().
+        """
+        vertices, axes = self.polygon()
+        hit, nx, ny, depth = circle_sat(ball.position.x, ball.position.y, ball.radius, vertices, axes)
+        if not hit:
+            return False, 0, 0
+        return True, Vector(nx, ny), depth
+
     def is_collision(self, ball):
-        tri_vertices = self.calculate_vertices()
-
-        # Erstelle ein Rechteck um den Ball
-        ball_rect = Rect(Vector(ball.position.x - ball.radius, ball.position.y - ball.radius),
-                         ball.radius * 2, ball.radius * 2)
-
-        normals = []
-        overlaps = []
-        for i in range(len(tri_vertices)):
-            edge = tri_vertices[(i + 1) % len(tri_vertices)] - tri_vertices[i]
-            normal = Vector(-edge.y, edge.x).normalize()
-            normals.append(normal)
-
-            # Berechne Projektionen für das Dreieck und das Ball-Rechteck
-            tri_projections = [p.dot(normal) for p in tri_vertices]
-            ball_rect_projections = [p.dot(normal) for p in ball_rect.calculate_vertices()]
-
-            min_tri = min(tri_projections)
-            max_tri = max(tri_projections)
-            min_ball_rect = min(ball_rect_projections)
-            max_ball_rect = max(ball_rect_projections)
-
-            overlap = min(max_tri, max_ball_rect) - max(min_tri, min_ball_rect)
-            overlaps.append(overlap)
-
-            # Überprüfe die Kollision zwischen dem Ball-Rechteck und dem Dreieck
-            if max_ball_rect < min_tri or min_ball_rect > max_tri:
-                # Es gibt eine separierende Achse!
-                return False, 0
-
-        # Wenn keine separierende Achse gefunden wurde, gibt es eine Kollision
-        min_overlap = (np.argmin(overlaps), np.min(overlaps))
-        return True, normals[min_overlap[0]]
+        hit, normal, _ = self.contact(ball)
+        return hit, normal
     
     
+    def aabb(self):
+        """
+        Gibt das umgebende Rechteck als (min_x, min_y, max_x, max_y) zurück.
+        """
+        xs = [p.x for p in self.calculate_vertices()]
+        ys = [p.y for p in self.calculate_vertices()]
+        return min(xs), min(ys), max(xs), max(ys)
+
     def draw_triangle(self, screen):
         triangle_vertices = self.calculate_vertices()
         pygame.draw.polygon(screen, (255, 0, 0), [(v.x, v.y) for v in triangle_vertices],5)
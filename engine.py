@@ -0,0 +1,588 @@
+import time
+from time import perf_counter_ns
+
+from broadphase import UniformGrid
+from classes import Ball, Bat, Rect, Triangle, Vector
+from collision import sweep_circle_polygon, sweep_circle_rotating, sweep_point_circle
+from layout import DEFAULT as DEFAULT_LAYOUT, load_layout
+from profiler import NULL_PROFILER
+
+# Input bits for Table.step(), one bit per key of the game
+LAUNCH = 1  # Space
+LEFT = 2    # Arrow left
+RIGHT = 4   # Arrow right
+RESET = 8   # R
+
+
+class Table:
+    '''
+    Headless flipper table.
+
+    Holds the complete game state of main() (balls, bats, obstacles, score,
+    holes and the ball2 spawn rule) without any display. The table is advanced
+    one physics frame at a time with step(), which takes the pressed keys as
+    input bits and returns the events of that frame ('launch', 'bumper',
+    'drain', 'reset'). Time is simulated, so the table runs as fast as the
+    machine allows and gives the same result on every run.
+
+    With swept=True the balls are moved with continuous collision detection:
+    every step looks for the first time of impact with the bats, obstacles
+    and bumpers along the whole path of the ball (including the rotation of
+    the bats) and stops the ball there, so no ball can pass through a bat
+    however far it moves in one step. This allows long steps: with
+    time_scale=k one step covers k frames of simulated time.
+    '''
+
+    def __init__(self, width=None, height=None, fps_multiplyer=5, swept=False, time_scale=1,
+                 damp=0.8, roll=0.995, anschlag=None, launch=8.5, big_ball_speed=None, layout=None):
+        '''
+        Parameters:
+            width, height (int): Size of the table in pixels (default: from the layout).
+            fps_multiplyer (int): Same meaning as in main(), one frame lasts
+                1000 / (200 * fps_multiplyer) simulated milliseconds.
+            swept (bool): Use continuous collision detection for the balls.
+            time_scale (int): Frames of simulated time per step (only with swept=True).
+            damp, roll (float): Bounce and rolling friction at the table borders, see Ball.check_screen_collide().
+            anschlag (int or (int, int)): Stop angle of the left and right bat in degrees, one for
+                both or a (left, right) pair (default: from the layout).
+            launch (float): Launch speed of the balls (before fps_multiplyer and the 10 % boost).
+            big_ball_speed (float): Speed of the moving bumper (default: from the layout).
+            layout (str, Path or dict): Layout file or a layout of layout.load_layout()
+                (default: tables/default.json).
+        '''
+        if time_scale != 1 and not swept:
+            raise ValueError("time_scale > 1 needs swept=True, the discrete collision tests would tunnel")
+        if not isinstance(layout, dict):
+            layout = load_layout(layout or DEFAULT_LAYOUT)
+        self.layout = layout
+        self.width = width or layout['size'][0]
+        self.height = height or layout['size'][1]
+        self.fps_multiplyer = fps_multiplyer
+        self.frame_ms = 1000 / (200 * fps_multiplyer)
+        self.swept = swept
+        self.time_scale = time_scale
+        self.step_ms = self.frame_ms * time_scale
+        self.max_contacts = 4  # Contacts per ball and step in swept mode
+        self.profiler = NULL_PROFILER  # Times the phases of step(), see profiler.py
+        self.damp = damp
+        self.roll = roll
+        self.launch = launch
+
+        # Holes at the bottom of the table
+        self.hole_w, self.hole_h = layout['holes']
+
+        # Balls
+        self.ball1 = Ball(None, Vector(20, 660), Vector(0, 0), 10)
+        self.ball2 = Ball(None, Vector(20, 660), Vector(0, 0), 10)
+
+        # Shapes, in the order of the layout
+        self.obstacles = []
+        for item in layout['obstacles']:
+            if 'rect' in item:
+                x, y, width, height = item['rect']
+                obj = Rect(Vector(x, y), width, height, polygon=(item['vertices'], item['axes']))
+            else:
+                obj = Triangle(*[Vector(x, y) for x, y in item['vertices']], polygon=(item['vertices'], item['axes']))
+            self.obstacles.append(obj)
+        self.bumpers = [Ball(None, Vector(*item['center']), Vector(0, 0), item['radius'], grav=Vector(0, 0))
+                        for item in layout['bumpers']]
+        named = {item['name']: obj for item, obj in zip(layout['obstacles'] + layout['bumpers'],
+                                                         self.obstacles + self.bumpers)}
+        self.rect1 = named['rect1']
+        self.big_ball = named['big_ball']
+
+        # Bats, from the precomputed pose tables
+        if anschlag is not None and not isinstance(anschlag, (tuple, list)):
+            anschlag = (anschlag, anschlag)
+        for item in layout['bats']:
+            bat_anschlag = item.get('anschlag', 50)
+            if anschlag is not None and item['name'] in ('left_bat', 'right_bat'):
+                bat_anschlag = anschlag[item['name'] == 'right_bat']
+            bat = Bat(None, item.get('color', 'green'), [Vector(x, y) for x, y in item['points']],
+                      right=item.get('right', False), anschlag=bat_anschlag, poses=item['poses'])
+            named[item['name']] = bat
+        self.left_bat = named['left_bat']
+        self.right_bat = named['right_bat']
+        self.starter_bat = named['starter_bat']
+        self.bats = [self.left_bat, self.right_bat, self.starter_bat]
+        self.named = named
+
+        # Broadphase, only objects near a ball reach the narrowphase.
+        # Bats are stored with the area of all their poses, so they never move in the grid.
+        self.bat_index = UniformGrid()
+        for bat in [self.left_bat, self.right_bat]:
+            self.bat_index.insert(bat, bat.swept_aabb())
+        self.bumper_index = UniformGrid()
+        for item, bumper in zip(layout['bumpers'], self.bumpers):
+            handle = self.bumper_index.insert(bumper, item['aabb'])
+            if bumper is self.big_ball:
+                self.big_ball_handle = handle
+        self.obstacle_index = UniformGrid()
+        for item, obj in zip(layout['obstacles'], self.obstacles):
+            self.obstacle_index.insert(obj, item['aabb'])
+        self.rect1_handle = self.obstacles.index(self.rect1)
+
+        # Bat outlines relative to their pivot, for the swept test against the rotating bat
+        outlines = {item['name']: item['outline'] for item in layout['bats']}
+        self.bat_shapes = {self.left_bat: outlines['left_bat'], self.right_bat: outlines['right_bat']}
+
+        # Movement
+        self.rect_speed = layout['movers'].get('rect1', 0)
+        self.big_ball_speed = layout['movers'].get('big_ball', 0) if big_ball_speed is None else big_ball_speed
+
+        # Game state
+        self.ball2_here = False
+        self.starter1 = True
+        self.starter2 = False
+        self.score = 0
+        self.scores = [self.score]
+        self.roundnr = 0
+        self.last_drain = None  # Position where the last ball left the table
+
+        # Times
+        self.frame = 0
+        self.ticks = 0
+        self.ball2_time_begin = 0
+
+    @property
+    def highscore(self):
+        '''
+        Best score of all rounds played on this table.
+        '''
+        return max(self.scores)
+
+    def balls(self):
+        '''
+        Returns the balls that are currently in play.
+        '''
+        if self.ball2_here:
+            return [self.ball1, self.ball2]
+        return [self.ball1]
+
+    def idle(self):
+        '''
+        Whether no ball is in play: ball1 waits in the launcher and ball2 is not on the table.
+        '''
+        return self.starter1 and not self.ball2_here
+
+    def snapshot(self):
+        '''
+        Returns the positions of everything that moves smoothly (ball1, ball2,
+        big_ball, rect1) as (x, y) tuples, e.g. to interpolate between two frames.
+        '''
+        return [(self.ball1.position.x, self.ball1.position.y),
+                (self.ball2.position.x, self.ball2.position.y),
+                (self.big_ball.position.x, self.big_ball.position.y),
+                (self.rect1.position.x, self.rect1.position.y)]
+
+    def get_state(self):
+        '''
+        Returns everything that changes while the table runs, see set_state().
+        '''
+        ball1, ball2 = self.ball1, self.ball2
+        return {'ball1': (ball1.position.x, ball1.position.y, ball1.velocity.x, ball1.velocity.y),
+                'ball2': (ball2.position.x, ball2.position.y, ball2.velocity.x, ball2.velocity.y),
+                'big_ball': (self.big_ball.position.x, self.big_ball.position.y),
+                'rect1': (self.rect1.position.x, self.rect1.position.y),
+                'bats': [(bat.angle, bat.direction, bat.count, bat.active) for bat in self.bats],
+                'rect_speed': self.rect_speed,
+                'big_ball_speed': self.big_ball_speed,
+                'ball2_here': self.ball2_here,
+                'starter1': self.starter1,
+                'starter2': self.starter2,
+                'score': self.score,
+                'best': max(self.scores[:-1], default=0),
+                'roundnr': self.roundnr,
+                'frame': self.frame,
+                'ticks': self.ticks,
+                'ball2_time_begin': self.ball2_time_begin}
+
+    def set_state(self, state):
+        '''
+        Restores a state of get_state(). The table then continues exactly as the
+        table the state was taken from. Of the earlier rounds only the best
+        score is kept, which is all highscore needs.
+        '''
+        for ball, (x, y, vx, vy) in ((self.ball1, state['ball1']), (self.ball2, state['ball2'])):
+            ball.position = Vector(x, y)
+            ball.velocity = Vector(vx, vy)
+        self.big_ball.position = Vector(*state['big_ball'])
+        self.rect1.position = Vector(*state['rect1'])
+        for bat, (angle, direction, count, active) in zip(self.bats, state['bats']):
+            bat.angle, bat.direction, bat.count, bat.active = angle, direction, count, active
+            _, bat.points_tuple, bat.center, bat.axes = bat.pose(angle)
+        self.rect_speed = state['rect_speed']
+        self.big_ball_speed = state['big_ball_speed']
+        self.ball2_here = state['ball2_here']
+        self.starter1 = state['starter1']
+        self.starter2 = state['starter2']
+        self.score = state['score']
+        self.roundnr = state['roundnr']
+        self.scores = [state['best']] * self.roundnr + [self.score]
+        self.frame = state['frame']
+        self.ticks = state['ticks']
+        self.ball2_time_begin = state['ball2_time_begin']
+        self.obstacle_index.update(self.rect1_handle, self.rect1.aabb())
+        self.bumper_index.update(self.big_ball_handle, self.big_ball.aabb())
+
+    def nearby(self, index, ball, after=-1):
+        '''
+        Returns the handles of the collision candidates for a ball, see UniformGrid.query().
+        The SAT tests reach up to about four radii around the ball center.
+        '''
+        return index.query(ball.aabb(3 * ball.radius), after)
+
+    def start1(self):
+        self.ball1.velocity = Vector(0, -self.launch * self.fps_multiplyer) * 1.1
+
+    def start2(self):
+        self.ball2.velocity = Vector(0, -self.launch * self.fps_multiplyer) * 1.1
+
+    def new_round(self):
+        '''
+        Ends the current round and puts both balls back into the launcher.
+        '''
+        self.roundnr += 1
+        self.score = 0
+        self.scores.append(self.score)
+        self.ball2_here = False
+        self.ball1.reset()
+        self.ball2.reset()
+
+    def handle_inputs(self, inputs, events):
+        '''
+        Applies the keys pressed in this frame.
+        '''
+        if inputs & LAUNCH:
+
+            # Check if one of the balls is allowed to start
+            if self.starter1 or self.starter2:
+
+                # Bat can hit the ball again
+                self.starter_bat.count = 0
+                events.append('launch')
+
+            if self.starter1:
+                self.start1()
+                self.starter1 = False
+
+            if self.starter2:
+                self.start2()
+                self.starter2 = False
+
+        if inputs & LEFT:
+            # Left Bat can move again
+            self.left_bat.count = 0
+
+        if inputs & RIGHT:
+            # Right Bat can move again
+            self.right_bat.count = 0
+
+        if inputs & RESET:
+            # If Reset is pressed, the game will be reset
+            self.starter1 = True
+            self.starter2 = False
+            self.new_round()
+            events.append('reset')
+
+    def move_objects(self):
+        '''
+        Moves rect1 and big_ball by one frame.
+        '''
+        rect1, big_ball = self.rect1, self.big_ball
+        radius = self.ball1.radius
+        if rect1.position.x < 45 + 2*radius or (rect1.position.x + rect1.width) > self.width - 2*radius:
+
+            self.rect_speed *= -1
+
+        rect1.position.x += self.rect_speed
+
+        if big_ball.position.x - big_ball.radius < 46 + 4*radius:
+
+            self.big_ball_speed *= -1
+
+        elif big_ball.position.x + big_ball.radius > self.width - 4*radius:
+
+            self.big_ball_speed *= -1
+
+        big_ball.position.x += self.big_ball_speed * 0.2
+
+    def move_discrete(self, ball, events):
+        '''
+        Moves a ball by one frame and resolves the overlaps with bumpers and obstacles afterwards.
+        '''
+        for handle in self.nearby(self.bumper_index, ball):
+
+            ball.check_collision(self.bumper_index.objects[handle], events)
+
+        ball.gravitate()
+
+        profiler = self.profiler
+        if profiler.enabled: begin = perf_counter_ns()
+        handles = self.nearby(self.obstacle_index, ball)
+        while handles:
+
+            handle = handles.pop(0)
+            obj = self.obstacle_index.objects[handle]
+            hit, normal, _ = obj.contact(ball)
+            if hit:
+
+                tangent = normal.rotate(90)
+                vt = ball.velocity.dot(tangent)
+                vn = ball.velocity.dot(normal)
+                # Reflect at the obstacle and push the ball back along its old direction
+                ball.position.add_scaled(ball.velocity.normalize_ip(), -10)
+                ball.velocity.x = tangent.x * vt - normal.x * vn
+                ball.velocity.y = tangent.y * vt - normal.y * vn
+                if obj == self.rect1: self.score += 1
+
+                # The ball was pushed away, look again from its new position
+                handles = self.nearby(self.obstacle_index, ball, handle)
+
+        if profiler.enabled: profiler.lap('obstacles', begin)
+
+    def move_swept(self, ball, bat_angles, events):
+        '''
+        Moves a ball by one step with continuous collision detection.
+
+        The ball follows the same path as with gravitate(), but is stopped at
+        the first contact with a bat, obstacle or bumper on the way, bounces
+        off and uses the rest of the step from there (up to max_contacts
+        times). Bats are tested with the angles they pass during the step.
+
+        Parameters:
+            bat_angles (dict): Bat -> its angles at the start and after every frame of the step.
+        '''
+        DT = 0.7 * self.time_scale
+        radius = ball.radius
+        ball.velocity.add_scaled(ball.grav, DT * 0.5)
+
+        used = 0.0  # Part of the step that is already done
+        for _ in range(self.max_contacts):
+            rest = 1.0 - used
+            px, py = ball.position.x, ball.position.y
+            mx = (ball.velocity.x * DT + ball.grav.x * DT**2 * 0.5) * rest
+            my = (ball.velocity.y * DT + ball.grav.y * DT**2 * 0.5) * rest
+            area = (min(px, px + mx) - radius, min(py, py + my) - radius,
+                    max(px, px + mx) + radius, max(py, py + my) + radius)
+
+            # First contact along the path
+            first = None
+            for handle in self.obstacle_index.query(area):
+                obj = self.obstacle_index.objects[handle]
+                vertices = obj.polygon()[0]
+                hit = sweep_circle_polygon(px, py, mx, my, radius, vertices)
+                if hit is not None and (first is None or hit[0] < first[0]):
+                    first = hit[0], hit[1], hit[2], obj, None
+
+            for handle in self.bat_index.query(area):
+                bat = self.bat_index.objects[handle]
+                pivot, outline = self.bat_shapes[bat]
+                hit = sweep_circle_rotating(px, py, mx, my, radius, pivot, outline, bat_angles[bat], used)
+                if hit is not None and (first is None or hit[0] < first[0]):
+                    first = hit[0], hit[1], hit[2], bat, (hit[3] / DT, hit[4] / DT)
+
+            for handle in self.bumper_index.query(area):
+                other = self.bumper_index.objects[handle]
+                t = sweep_point_circle(px, py, mx, my, other.position.x, other.position.y, max(radius, other.radius))
+                if t is not None and (first is None or t < first[0]):
+                    first = t, 0.0, 0.0, other, None
+
+            if first is None:
+                ball.position.x = px + mx
+                ball.position.y = py + my
+                return
+
+            toi, nx, ny, obj, surface = first
+            ball.position.x = px + mx * toi + nx * 0.01
+            ball.position.y = py + my * toi + ny * 0.01
+            used += rest * toi
+
+            if isinstance(obj, Ball):
+                # Bumper: same response as Ball.check_collision()
+                events.append('bumper')
+                ball.velocity *= -1.1
+                if obj is self.big_ball and ball is self.ball1 and ball.velocity.abs() >= 7:
+                    self.ball2_here = True
+                    self.ball2_time_begin = self.ticks
+                continue
+
+            # Reflect the velocity relative to the surface, so a moving bat kicks the ball.
+            # Gravity is part of the motion over the step, so it is part of the reflected velocity too
+            ux, uy = surface or (0.0, 0.0)
+            vx = ball.velocity.x + ball.grav.x * DT * 0.5 - ux
+            vy = ball.velocity.y + ball.grav.y * DT * 0.5 - uy
+            vn = vx * nx + vy * ny
+            if vn < 0:
+                ball.velocity.x -= 2 * vn * nx
+                ball.velocity.y -= 2 * vn * ny
+            if obj is self.rect1: self.score += 1
+
+    def step(self, inputs=0):
+        '''
+        Advances the table by one frame.
+
+        Parameters:
+            inputs (int): Pressed keys as a combination of LAUNCH, LEFT, RIGHT and RESET.
+
+        Returns:
+            events (list of str): Everything that happened in this frame.
+        '''
+        events = []
+        profiler = self.profiler
+        timed = profiler.enabled
+        if timed: begin = perf_counter_ns()
+        ball1, ball2 = self.ball1, self.ball2
+        big_ball = self.big_ball
+
+        # Check if ball2 is here
+        if self.ball2_here and not self.starter1 and ball2.velocity.abs() <= 1:
+
+            # Ball2 darf starten
+            self.starter2 = True
+
+        # Check if ball2 is allowed to spawn
+        if ball1.check_collision(big_ball, events) == True:
+
+            self.ball2_here = True
+            self.ball2_time_begin = self.ticks
+
+        # After ball2 is 20 sec in the game, code checks if ball2 is allowed to spawn
+        if self.ticks - self.ball2_time_begin > 20000:
+
+            self.ball2_here = bool(ball1.check_collision(big_ball, events))
+
+        self.handle_inputs(inputs, events)
+        if timed: begin = profiler.lap('inputs', begin)
+
+        # Bats, with the angles they pass in this step for the swept test
+        bat_angles = {}
+        for bat in self.bats:
+            angles = bat_angles[bat] = [bat.angle]
+            for _ in range(self.time_scale):
+                bat.flip()
+                angles.append(bat.angle)
+
+        balls = self.balls()
+        for ball in balls:
+
+            # Check if the ball is too slow, so the game gives a score penalty
+            if ball.velocity.abs() < 1 * self.fps_multiplyer:
+
+                for i in range(self.time_scale):
+                    if (self.ticks + i * self.frame_ms) % 5000 <= 3: self.score -= 1
+
+            if self.swept:
+                # Swept balls meet the bats in move_swept()
+                continue
+
+            handles = self.nearby(self.bat_index, ball)
+            while handles:
+
+                handle = handles.pop(0)
+                bat = self.bat_index.objects[handle]
+                if ball.sat_algo(bat.points_tuple, bat):
+
+                    # The ball was pushed away, look again from its new position
+                    handles = self.nearby(self.bat_index, ball, handle)
+
+        if timed: begin = profiler.lap('bats', begin)
+
+        # Let objects that are supposed to move, move
+        for _ in range(self.time_scale):
+            self.move_objects()
+
+        self.obstacle_index.update(self.rect1_handle, self.rect1.aabb())
+        self.bumper_index.update(self.big_ball_handle, big_ball.aabb())
+        if timed: begin = profiler.lap('movers', begin)
+
+        # Motion
+        if self.ball2_here:
+            ball1.check_collision(ball2, events)
+        else:
+            ball2.reset()
+
+        # Screen borders
+        screen_borders = Vector(self.width, self.height - self.hole_h)
+
+        for ball in balls:
+
+            if self.swept:
+                self.move_swept(ball, bat_angles, events)
+            else:
+                self.move_discrete(ball, events)
+
+            if ball.velocity.abs() > 10:
+
+                # Velocity cap
+                ball.velocity *= 0.7
+
+            if (abs(ball.position.x - self.width/2) < (self.width - 2*self.hole_w)/2
+                    and self.height - ball.position.y < 200):
+
+                # Above checks two things:
+                    # 1. Is the distance in x-distance of the ball from the middle of the screen smaller than the half the x-distance of the hole from the middle of the screen?
+                    # 2. Is ball y-distance from the bottom of the screen smaller than height of the hole?
+
+                # If those conditions are met, the ball is not colliding at the bottom
+
+                if self.height - ball.position.y < 1:
+
+                    # If the ball is now even at the bottom, then the game is over
+                    self.last_drain = (ball.position.x, ball.position.y)
+                    ball.check_screen_collide(screen_borders, self.damp, self.roll)
+                    self.starter1 = True
+                    self.starter2 = True
+                    self.new_round()
+                    events.append('drain')
+
+            else:
+
+                ball.check_screen_collide(screen_borders, self.damp, self.roll)
+
+        if timed: profiler.lap('balls', begin)
+
+        # Highscore
+        self.scores[self.roundnr] = self.score
+
+        self.frame += 1
+        self.ticks += self.step_ms
+        return events
+
+
+def run(frames, inputs=None):
+    '''
+    Runs a table headless for a number of frames.
+
+    Parameters:
+        frames (int): Number of frames to simulate.
+        inputs (callable): Gets the table and returns the input bits for the next frame.
+
+    Returns:
+        table (Table): The table after the last frame.
+    '''
+    table = Table()
+    for _ in range(frames):
+        table.step(inputs(table) if inputs else 0)
+    return table
+
+
+def autoplay(table):
+    '''
+    Simple policy for headless runs: launches every ball and keeps both bats flipping.
+    '''
+    inputs = LAUNCH if table.starter1 or table.starter2 else 0
+    if table.frame % 150 == 0:
+        inputs |= LEFT | RIGHT
+    return inputs
+
+
+if __name__ == '__main__':
+    import sys
+
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    begin = time.perf_counter()
+    table = run(frames, autoplay)
+    elapsed = time.perf_counter() - begin
+    print(f'{frames} frames in {elapsed:.2f} s ({frames / elapsed:.0f} frames/s), '
+          f'rounds: {table.roundnr}, highscore: {table.highscore}')
@@ -0,0 +1,393 @@
+"""
+Many flipper tables stepped together, for policy training and play-testing.
+
+    env = FlipperEnv(4096)
+    observation = env.reset(seed=0)
+    for _ in range(10000):
+        actions = policy(observation)                  # int array, LAUNCH | LEFT | RIGHT per table
+        observation, reward, done = env.step(actions)
+
+Every table has one ball and its own left and right bat, score and
+launcher. One step() advances all tables by one frame with NumPy
+operations over the whole batch: the ball state lives in a BallArray, the
+bats are arrays of angles that index the pose tables of the layout, and
+the circle tests against bats and obstacles use the kernel of satbatch.py.
+The physics are those of Table.step() in discrete mode (Ball.collide at
+the bats, the obstacle response of Table.move_discrete, Ball.check_collision
+at the bumpers, the holes and the slow-ball penalty), so a table of the
+batch with jitter=0 follows the same path as a Table until ball2 would come
+into play. Ball2 is left out: the big bumper bounces the ball, but does not
+let a second ball in.
+
+rect1 and big_ball move the same way on every table (their movement does
+not depend on the ball), so they are taken from one template Table that is
+moved once per frame for the whole batch.
+
+A table whose ball drains reports done=True and starts its next round
+right away, with the ball back in the launcher and the score at 0.
+"""
+import math
+
+import numpy as np
+
+from ballarray import BallArray
+from classes import Vector
+from engine import LAUNCH, LEFT, RIGHT, RESET, Table
+from satbatch import PolygonPack, circle_polygons
+
+# Columns of the observation
+OBSERVATION = ('x', 'y', 'vx', 'vy', 'left_angle', 'right_angle', 'waiting')
+
+
+class BatArray:
+    '''
+    State of one bat (e.g. left_bat) on every table, see Bat.flip().
+
+    Attributes:
+        angle, direction, count, active (ndarray of int, shape (n,)): Same meaning as in Bat.
+        poses (PolygonPack): Polygon of every angle between the two stops, row angle - first.
+    '''
+
+    def __init__(self, bat, n):
+        '''
+        Parameters:
+            bat (Bat): Bat of the template table, gives the stops and the pose table.
+            n (int): Number of tables.
+        '''
+        self.right = bat.right
+        self.anschlag = bat.anschlag
+        self.first = min(bat.poses)
+        angles = range(self.first, max(bat.poses) + 1)
+        self.poses = PolygonPack([(bat.pose(angle)[1], bat.pose(angle)[3]) for angle in angles])
+        self.start = (bat.angle, bat.direction, bat.count, bat.active)
+        self.angle = np.full(n, bat.angle)
+        self.direction = np.full(n, bat.direction)
+        self.count = np.full(n, bat.count)
+        self.active = np.full(n, bat.active)
+
+    def reset(self, mask=None):
+        '''
+        Puts the bats (all, or those of the masked tables) back to their start pose.
+        '''
+        mask = slice(None) if mask is None else mask
+        self.angle[mask], self.direction[mask], self.count[mask], self.active[mask] = self.start
+
+    def flip(self):
+        '''
+        One frame of Bat.flip() on every table.
+        '''
+        upper = 20 * self.right
+        at_stop = (self.angle == -self.anschlag * self.right) | (self.angle == upper)
+        moving = at_stop | (self.active != 0) | (self.count < 1)
+
+        turn = moving & at_stop
+        self.direction[turn] *= -1
+        self.count[turn & (self.angle == upper)] += 1
+        self.angle[moving] -= self.direction[moving] * self.active[moving]
+        self.active[moving] = self.count[moving] < 1
+
+    def collide(self, x, y, radius):
+        '''
+        Circle test of every ball against the bat of its own table.
+
+        Returns:
+            hit (ndarray of bool, shape (n,)), normal (ndarray, shape (n, 2)): See circle_polygons().
+        '''
+        row = self.angle - self.first
+        poses = self.poses
+        hit, normal, _ = circle_polygons(x[:, None, None], y[:, None, None], radius[:, None, None],
+                                         poses.vertices[row][:, None], poses.normals[row][:, None],
+                                         poses.low[row][:, None], poses.high[row][:, None],
+                                         poses.valid[row][:, None])
+        return hit[:, 0], normal[:, 0]
+
+
+class FlipperEnv:
+    '''
+    N independent flipper tables with a batched reset()/step() interface.
+
+    Attributes:
+        n (int): Number of tables.
+        table (Table): Template table with the layout, the settings and the moving objects.
+        balls (BallArray): Ball of every table.
+        left, right (BatArray): Bats of every table.
+        score (ndarray of int): Score of the current round of every table.
+        rounds (ndarray of int): Finished rounds of every table.
+        waiting (ndarray of bool): The ball of the table is in the launcher.
+        launch (ndarray): Launch speed of every table for the current round.
+    '''
+
+    def __init__(self, n, layout=None, fps_multiplyer=5, damp=0.8, roll=0.995, anschlag=None, launch=8.5,
+                 jitter=0.05):
+        '''
+        Parameters:
+            n (int): Number of tables.
+            layout, fps_multiplyer, damp, roll, anschlag, launch: Table settings, see Table.
+            jitter (float): The launch speed of every round is varied by up to this fraction.
+        '''
+        self.n = n
+        self.settings = dict(layout=layout, fps_multiplyer=fps_multiplyer, damp=damp, roll=roll,
+                             anschlag=anschlag, launch=launch)
+        self.jitter = jitter
+        self.rng = np.random.default_rng()
+
+        # Obstacles, bumpers and the bat stops are the same on all tables
+        self.table = table = Table(**self.settings)
+        self.obstacles = PolygonPack(table.obstacles)
+        self.bumpers = table.bumpers
+        self.screen_borders = Vector(table.width, table.height - table.hole_h)
+        self.start = (table.ball1.position.x, table.ball1.position.y)
+        self.radius = table.ball1.radius
+
+        self.balls = BallArray(n)
+        for _ in range(n):
+            self.balls.add(self.start, (0, 0), self.radius, table.ball1.grav)
+        self.left = BatArray(table.left_bat, n)
+        self.right = BatArray(table.right_bat, n)
+        self.score = np.zeros(n, dtype=int)
+        self.rounds = np.zeros(n, dtype=int)
+        self.waiting = np.ones(n, dtype=bool)
+        self.launch = np.full(n, float(launch))
+
+    def reset(self, seed=None):
+        '''
+        Starts a new game on every table.
+
+        Parameters:
+            seed (int): Seed of the launch speed variation.
+
+        Returns:
+            observation (ndarray, shape (n, 7)): See observe().
+        '''
+        self.rng = np.random.default_rng(seed)
+        self.table = table = Table(**self.settings)
+        self.obstacles = PolygonPack(table.obstacles)
+        self.bumpers = table.bumpers
+        self.balls.position[:] = self.start
+        self.balls.velocity[:] = 0
+        self.left.reset()
+        self.right.reset()
+        self.score[:] = 0
+        self.rounds[:] = 0
+        self.waiting[:] = True
+        self.launch[:] = self.vary_launch(self.n)
+        return self.observe()
+
+    def vary_launch(self, count):
+        '''
+        Draws the launch speeds of count new rounds.
+        '''
+        return self.table.launch * (1 + self.rng.uniform(-self.jitter, self.jitter, count))
+
+    def observe(self):
+        '''
+        Returns the observation of every table, one row per table with the columns of OBSERVATION.
+        '''
+        observation = np.empty((self.n, len(OBSERVATION)))
+        observation[:, 0:2] = self.balls.position
+        observation[:, 2:4] = self.balls.velocity
+        observation[:, 4] = self.left.angle
+        observation[:, 5] = self.right.angle
+        observation[:, 6] = self.waiting
+        return observation
+
+    def step(self, actions):
+        '''
+        Advances every table by one frame.
+
+        Parameters:
+            actions (array-like of int, shape (n,)): Pressed keys per table as a
+                combination of LAUNCH, LEFT, RIGHT and RESET (see engine.py).
+
+        Returns:
+            observation (ndarray, shape (n, 7)): See observe().
+            reward (ndarray of int, shape (n,)): Change of the score in this frame.
+            done (ndarray of bool, shape (n,)): The round ended (ball drained or RESET), the table starts the next one.
+        '''
+        table = self.table
+        actions = np.asarray(actions)
+        balls = self.balls
+        position, velocity, radius = balls.position, balls.velocity, balls.radius
+
+        # Bounce at the big bumper, once more after 20 s like the ball2 spawn check of Table.step()
+        self.bounce(table.big_ball)
+        if table.ticks - table.ball2_time_begin > 20000:
+            self.bounce(table.big_ball)
+
+        # Inputs
+        launching = (actions & LAUNCH).astype(bool) & self.waiting
+        velocity[launching, 0] = 0.0
+        velocity[launching, 1] = -self.launch[launching] * table.fps_multiplyer * 1.1
+        self.waiting[launching] = False
+        self.left.count[(actions & LEFT).astype(bool)] = 0
+        self.right.count[(actions & RIGHT).astype(bool)] = 0
+        resetting = (actions & RESET).astype(bool)
+        self.waiting[resetting] = True
+        self.new_round(resetting)
+        score_before = self.score.copy()
+
+        self.left.flip()
+        self.right.flip()
+
+        # Score penalty for slow balls
+        speed = np.sqrt(velocity[:, 0] * velocity[:, 0] + velocity[:, 1] * velocity[:, 1])
+        if table.ticks % 5000 <= 3:
+            self.score[speed < 1 * table.fps_multiplyer] -= 1
+
+        for bat in (self.left, self.right):
+            hit, normal = bat.collide(position[:, 0], position[:, 1], radius)
+            if hit.any():
+                self.hit_bat(bat, hit, normal[hit])
+
+        table.move_objects()
+        self.obstacles.refresh([table.rect1])
+
+        for bumper in self.bumpers:
+            self.bounce(bumper)
+        balls.gravitate()
+
+        # Obstacles in the order of the layout, each ball is tested against the next one from where it was pushed to
+        rect1 = self.obstacles.objects.index(table.rect1)
+        obstacles = self.obstacles
+        for j in range(len(obstacles.objects)):
+            hit, normal, _ = circle_polygons(position[:, 0, None, None], position[:, 1, None, None],
+                                             radius[:, None, None], obstacles.vertices[None, j:j + 1],
+                                             obstacles.normals[None, j:j + 1], obstacles.low[None, j:j + 1],
+                                             obstacles.high[None, j:j + 1], obstacles.valid[None, j:j + 1])
+            hit = hit[:, 0]
+            if hit.any():
+                self.hit_obstacle(hit, normal[hit, 0])
+                if j == rect1:
+                    self.score[hit] += 1
+
+        balls.cap_velocity()
+
+        # Holes
+        over_hole = balls.over_hole(table.width, table.height, table.hole_w)
+        drained = over_hole & (table.height - position[:, 1] < 1)
+        balls.check_screen_collide(self.screen_borders, table.damp, table.roll, mask=~over_hole)
+        reward = self.score - score_before
+        self.waiting[drained] = True
+        self.new_round(drained)
+
+        table.frame += 1
+        table.ticks += table.step_ms
+        return self.observe(), reward, drained | resetting
+
+    def new_round(self, mask):
+        '''
+        Ends the round of the masked tables and puts their balls back into the launcher.
+        '''
+        if not mask.any():
+            return
+        self.rounds[mask] += 1
+        self.score[mask] = 0
+        self.balls.position[mask] = self.start
+        self.balls.velocity[mask] = 0
+        self.launch[mask] = self.vary_launch(int(mask.sum()))
+
+    def bounce(self, bumper):
+        '''
+        Ball.check_collision() of every ball with a big bumper.
+        '''
+        position, velocity = self.balls.position, self.balls.velocity
+        dx = bumper.position.x - position[:, 0]
+        dy = bumper.position.y - position[:, 1]
+        distance = np.sqrt(dx * dx + dy * dy)
+        distance[distance == 0] = 1
+        hit = distance <= np.maximum(self.balls.radius, bumper.radius)
+        if not hit.any():
+            return
+        length = np.sqrt(dx[hit] * dx[hit] + dy[hit] * dy[hit])
+        length[length == 0] = 1
+        position[hit, 0] -= dx[hit] / length
+        position[hit, 1] -= dy[hit] / length
+        velocity[hit] *= -1.1
+
+    def hit_bat(self, bat, hit, normal):
+        '''
+        Ball.collide() of the hit balls with their bat.
+        '''
+        position, velocity = self.balls.position, self.balls.velocity
+        angle = math.radians(-90 * bat.right)
+        cos, sin = math.cos(angle), math.sin(angle)
+        nx, ny = normal[:, 0], normal[:, 1]
+        tx = nx * cos - ny * sin
+        ty = nx * sin + ny * cos
+        vx, vy = velocity[hit, 0], velocity[hit, 1]
+        vn = vx * nx + vy * ny
+        vt = vx * tx + vy * ty
+        new_x = -nx * vn + tx * vt
+        new_y = -ny * vn + ty * vt
+        length = np.sqrt(new_x * new_x + new_y * new_y)
+        length[length == 0] = 1
+        new_x /= length
+        new_y /= length
+        position[hit, 0] += new_x * 10
+        position[hit, 1] += new_y * 10
+        speed = np.sqrt(vx * vx + vy * vy)
+        boost = 1 + bat.active[hit]
+        velocity[hit, 0] = new_x * speed * boost
+        velocity[hit, 1] = new_y * speed * boost
+
+    def hit_obstacle(self, hit, normal):
+        '''
+        Obstacle response of Table.move_discrete() for the hit balls.
+        '''
+        position, velocity = self.balls.position, self.balls.velocity
+        nx, ny = normal[:, 0], normal[:, 1]
+        cos, sin = math.cos(math.radians(90)), math.sin(math.radians(90))
+        tx = nx * cos - ny * sin
+        ty = nx * sin + ny * cos
+        vx, vy = velocity[hit, 0], velocity[hit, 1]
+        vt = vx * tx + vy * ty
+        vn = vx * nx + vy * ny
+        speed = np.sqrt(vx * vx + vy * vy)
+        speed[speed == 0] = 1
+        position[hit, 0] += vx / speed * -10
+        position[hit, 1] += vy / speed * -10
+        velocity[hit, 0] = tx * vt - nx * vn
+        velocity[hit, 1] = ty * vt - ny * vn
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    from engine import autoplay
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    # Table 0 without jitter follows a Table with the same inputs until ball2 comes into play
+    env = FlipperEnv(1, jitter=0)
+    env.reset(seed=0)
+    table = Table()
+    compared = 0
+    deviation = 0.0
+    while compared < 20000 and not table.ball2_here:
+        inputs = autoplay(table)
+        table.step(inputs)
+        observation, _, _ = env.step([inputs])
+        ball = table.ball1
+        deviation = max(deviation, abs(observation[0, 0] - ball.position.x), abs(observation[0, 1] - ball.position.y))
+        if env.score[0] != table.score:
+            deviation = math.inf
+        compared += 1
+    print(f'same path as Table for {compared} frames, largest position difference {deviation:.2e}')
+
+    env = FlipperEnv(n)
+    observation = env.reset(seed=0)
+    rng = np.random.default_rng(0)
+    total = np.zeros(n)
+    drains = 0
+    begin = time.perf_counter()
+    for _ in range(frames):
+        # Launch at once and flip at random
+        actions = LAUNCH | LEFT * (rng.random(n) < 0.02) | RIGHT * (rng.random(n) < 0.02)
+        observation, reward, done = env.step(actions)
+        total += reward
+        drains += int(done.sum())
+    elapsed = time.perf_counter() - begin
+    print(f'{n} tables x {frames} frames in {elapsed:.2f} s: {n * frames / elapsed:,.0f} table frames/s, '
+          f'{drains} drains, mean reward {total.mean():.2f}')
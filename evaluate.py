@@ -0,0 +1,245 @@
+"""
+Monte Carlo evaluation of table settings.
+
+    python evaluate.py --games 2000 --policy scripted --damp 0.7 --anschlag 40
+    python evaluate.py --games 2000 --layout my_table.json
+
+Plays many headless games with a flipper policy and prints a report of the
+score distribution, the ball lifetime, where the balls drain and how often
+the bumpers are hit. Every game gets its own seed, which perturbs the launch
+speed and drives the random policy, so a run with the same arguments gives
+the same report.
+
+The games run in a ProcessPoolExecutor. Each worker process imports the
+engine (and with it pygame) once and then plays games until the pool is
+done, so the import cost is paid per worker and not per game, and the
+throughput grows with the number of cores.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import LAUNCH, LEFT, RIGHT, RESET, Table
+from layout import DEFAULT as DEFAULT_LAYOUT, load_layout
+
+
+def random_policy(table, rng):
+    '''
+    Flips each bat at random moments.
+    '''
+    inputs = 0
+    if rng.random() < 0.02:
+        inputs |= LEFT
+    if rng.random() < 0.02:
+        inputs |= RIGHT
+    return inputs
+
+
+def scripted_policy(table, rng):
+    '''
+    Flips the bat on the side of a ball that falls towards the bats.
+    '''
+    inputs = 0
+    for ball in table.balls():
+        if ball.position.y > 640 and ball.velocity.y > 0 and ball.position.x > 45:
+            if ball.position.x < table.width / 2:
+                inputs |= LEFT
+            else:
+                inputs |= RIGHT
+    return inputs
+
+
+POLICIES = {'random': random_policy, 'scripted': scripted_policy}
+
+# Settings of the current worker process, see init_worker()
+_settings = None
+
+
+def init_worker(settings):
+    '''
+    Initializer of the worker processes: keeps the settings that are the same for every game.
+    '''
+    global _settings
+    _settings = settings
+
+
+def play_game(seed, settings=None):
+    '''
+    Plays one game of settings['rounds'] balls.
+
+    A round ends when a ball drains, or with a reset if it takes longer than
+    settings['max_round_ms'] (e.g. a ball resting in a corner).
+
+    Returns:
+        result (dict): Scores per round, round lengths in ms, x positions of
+        the drains, bumper hits, timeouts and the simulated time.
+    '''
+    settings = settings or _settings
+    rng = random.Random(seed)
+    table = Table(**settings['table'])
+    policy = POLICIES[settings['policy']]
+    launch = table.launch
+    jitter = settings['jitter']
+
+    lifetimes = []
+    drains = []
+    bumpers = 0
+    timeouts = 0
+    round_begin = 0.0
+    while table.roundnr < settings['rounds']:
+        inputs = policy(table, rng)
+        if table.starter1 or table.starter2:
+            table.launch = launch * (1 + rng.uniform(-jitter, jitter))
+            inputs |= LAUNCH
+        elif table.ticks - round_begin > settings['max_round_ms']:
+            inputs |= RESET
+            timeouts += 1
+
+        for event in table.step(inputs):
+            if event == 'bumper':
+                bumpers += 1
+            elif event == 'drain' or event == 'reset':
+                lifetimes.append(table.ticks - round_begin)
+                round_begin = table.ticks
+                if event == 'drain':
+                    drains.append(table.last_drain[0])
+
+    return {'seed': seed,
+            'scores': table.scores[:settings['rounds']],
+            'lifetimes': lifetimes,
+            'drains': drains,
+            'bumpers': bumpers,
+            'timeouts': timeouts,
+            'ticks': table.ticks}
+
+
+def evaluate(games, policy='scripted', seed=0, rounds=3, jitter=0.05, max_round_ms=60000, workers=None, **table):
+    '''
+    Plays games in a process pool.
+
+    Parameters:
+        games (int): Number of games.
+        policy (str): Name in POLICIES.
+        seed (int): Seed of the first game, game i uses seed + i.
+        rounds (int): Balls per game.
+        jitter (float): Launch speed is varied by up to this fraction.
+        max_round_ms (float): Simulated time after which a round is reset.
+        workers (int): Worker processes (default: all cores).
+        table: Keyword arguments for Table, e.g. damp=0.7.
+
+    Returns:
+        results (list of dict): One result of play_game() per game, in seed order.
+    '''
+    settings = {'policy': policy, 'rounds': rounds, 'jitter': jitter,
+                'max_round_ms': max_round_ms, 'table': table}
+    workers = workers or os.cpu_count()
+    # Several games per task, so the pool does not pay a round trip per game
+    chunksize = max(1, games // (workers * 8))
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(settings,)) as pool:
+        return list(pool.map(play_game, range(seed, seed + games), chunksize=chunksize))
+
+
+def histogram(values, low, high, bins, width=40):
+    '''
+    Returns text lines with one bar per bin.
+    '''
+    counts = [0] * bins
+    size = (high - low) / bins
+    for value in values:
+        counts[min(bins - 1, max(0, int((value - low) / size)))] += 1
+    most = max(counts) or 1
+    return [f'{low + i * size:7.0f} {"#" * round(count / most * width)} {count}'
+            for i, count in enumerate(counts)]
+
+
+def summary(results):
+    '''
+    Aggregates the results of evaluate().
+    '''
+    scores = [score for result in results for score in result['scores']]
+    lifetimes = [lifetime for result in results for lifetime in result['lifetimes']]
+    minutes = sum(result['ticks'] for result in results) / 60000
+    deciles = statistics.quantiles(scores, n=10, method='inclusive') if len(scores) > 1 else scores * 9
+    return {'games': len(results),
+            'rounds': len(scores),
+            'score_mean': statistics.fmean(scores),
+            'score_stdev': statistics.pstdev(scores),
+            'score_min': min(scores),
+            'score_p10': deciles[0],
+            'score_p50': deciles[4],
+            'score_p90': deciles[8],
+            'score_max': max(scores),
+            'lifetime_mean_s': statistics.fmean(lifetimes) / 1000 if lifetimes else 0.0,
+            'bumpers_per_minute': sum(result['bumpers'] for result in results) / minutes if minutes else 0.0,
+            'timeouts': sum(result['timeouts'] for result in results),
+            'drains': sum(len(result['drains']) for result in results)}
+
+
+def report(results, width=600):
+    '''
+    Returns the report of evaluate() as text.
+    '''
+    stats = summary(results)
+    scores = [score for result in results for score in result['scores']]
+    drains = [x for result in results for x in result['drains']]
+    lines = [f"{stats['games']} games, {stats['rounds']} rounds",
+             f"Score:      mean {stats['score_mean']:.2f}, stdev {stats['score_stdev']:.2f}, "
+             f"min {stats['score_min']}, p10 {stats['score_p10']:.1f}, p50 {stats['score_p50']:.1f}, "
+             f"p90 {stats['score_p90']:.1f}, max {stats['score_max']}",
+             f"Lifetime:   {stats['lifetime_mean_s']:.1f} s per ball (simulated)",
+             f"Bumpers:    {stats['bumpers_per_minute']:.1f} hits per minute",
+             f"Round ends: {stats['drains']} drains, {stats['timeouts']} timeouts",
+             '',
+             'Score distribution:']
+    # Whole-numbered score bins, at most 20 of them
+    low, high = min(scores), max(scores) + 1
+    size = -(-(high - low) // 20)
+    bins = -(-(high - low) // size)
+    lines += histogram(scores, low, low + bins * size, bins)
+    lines += ['', 'Drain position (x):']
+    lines += histogram(drains, 0, width, 12)
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Monte Carlo evaluation of table settings.')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='scripted')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rounds', type=int, default=3, help='balls per game')
+    parser.add_argument('--jitter', type=float, default=0.05, help='relative variation of the launch speed')
+    parser.add_argument('--max-round', type=float, default=60, help='seconds until a round is reset')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--json', help='also write the summary and all results to this file')
+    parser.add_argument('--damp', type=float, default=0.8)
+    parser.add_argument('--roll', type=float, default=0.995)
+    parser.add_argument('--anschlag', type=int, default=None,
+                        help='stop angle of both bats (default: the stops of the layout)')
+    parser.add_argument('--launch', type=float, default=8.5)
+    parser.add_argument('--big-ball-speed', type=float, default=None, help='default: the speed of the layout')
+    parser.add_argument('--swept', action='store_true')
+    parser.add_argument('--layout', metavar='FILE', help='table layout (default: tables/default.json)')
+    parser.add_argument('--time-scale', type=int, default=1)
+    args = parser.parse_args()
+
+    table = {'damp': args.damp, 'roll': args.roll, 'anschlag': args.anschlag, 'launch': args.launch,
+             'big_ball_speed': args.big_ball_speed, 'swept': args.swept, 'time_scale': args.time_scale,
+             'layout': args.layout}
+    begin = time.perf_counter()
+    results = evaluate(args.games, args.policy, args.seed, args.rounds, args.jitter,
+                       args.max_round * 1000, args.workers, **table)
+    elapsed = time.perf_counter() - begin
+
+    print(report(results, load_layout(args.layout or DEFAULT_LAYOUT)['size'][0]))
+    print(f'\n{elapsed:.1f} s, {args.games / elapsed:.1f} games/s')
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'settings': vars(args), 'summary': summary(results), 'results': results}, file)
+
+
+if __name__ == '__main__':
+    main()
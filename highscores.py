@@ -0,0 +1,168 @@
+import csv
+import sqlite3
+
+
+class HighscoreStore:
+    '''
+    Highscores in a local SQLite database.
+
+    Every finished game is one appended row, so saving costs the same no
+    matter how many games are stored. The database runs in WAL mode with a
+    busy timeout, so several game instances can save at the same time
+    without overwriting each other. Indexes on score and name give fast
+    top-N and per-player queries.
+    '''
+
+    def __init__(self, path, timeout=10.0, check_same_thread=True):
+        '''
+        Parameters:
+            path (str or Path): Database file, created if it does not exist.
+            timeout (float): Seconds a writer waits for a lock held by another instance.
+            check_same_thread (bool): False allows to open the store on one
+                thread and use it on another (one thread at a time).
+        '''
+        self.connection = sqlite3.connect(str(path), timeout=timeout, isolation_level=None,
+                                          check_same_thread=check_same_thread)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, score INTEGER NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS scores_by_score ON scores (score DESC, id)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS scores_by_name ON scores (name, score DESC)")
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def close(self):
+        '''
+        Moves the write-ahead log into the database file and closes the connection.
+        '''
+        self.compact()
+        self.connection.close()
+
+    def compact(self):
+        '''
+        Checkpoints the write-ahead log and truncates it.
+        '''
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def add(self, name, score):
+        '''
+        Appends one finished game.
+        '''
+        self.connection.execute("INSERT INTO scores (name, score) VALUES (?, ?)", (name, int(score)))
+
+    def add_many(self, rows):
+        '''
+        Appends many (name, score) rows in one transaction and returns how many were added.
+        '''
+        rows = [(name, int(score)) for name, score in rows]
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany("INSERT INTO scores (name, score) VALUES (?, ?)", rows)
+        return len(rows)
+
+    def import_csv(self, path, only_if_empty=False):
+        '''
+        Imports a highscore file of the old CSV format (columns Name, Score).
+
+        Parameters:
+            path (str or Path): CSV file.
+            only_if_empty (bool): Import only into an empty database. The check
+                and the inserts are one transaction, so of several instances
+                starting at the same time only the first one imports.
+
+        Returns:
+            count (int): Number of imported games.
+        '''
+        with open(path, newline='') as file:
+            reader = csv.DictReader(file)
+            rows = [(row["Name"], int(float(row["Score"]))) for row in reader if row["Score"]]
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            if only_if_empty and len(self):
+                return 0
+            self.connection.executemany("INSERT INTO scores (name, score) VALUES (?, ?)", rows)
+        return len(rows)
+
+    def top(self, n=10):
+        '''
+        Returns the n best games as (name, score), the earlier game first on equal scores.
+        '''
+        return self.connection.execute(
+            "SELECT name, score FROM scores ORDER BY score DESC, id LIMIT ?", (n,)).fetchall()
+
+    def best_of(self, name):
+        '''
+        Returns the best score of a player, or None.
+        '''
+        return self.connection.execute("SELECT MAX(score) FROM scores WHERE name = ?", (name,)).fetchone()[0]
+
+    def player_bests(self):
+        '''
+        Returns (name, best score, number of games) for every player.
+        '''
+        return self.connection.execute("SELECT name, MAX(score), COUNT(*) FROM scores GROUP BY name").fetchall()
+
+
+class Leaderboard:
+    '''
+    In-memory index of the saved highscores.
+
+    Keeps the global best score (with the name of the first player who
+    reached it) and the best score of every player, so the HUD can ask for
+    both in O(1) instead of scanning the whole highscore table every frame.
+    '''
+
+    def __init__(self, rows=()):
+        '''
+        Parameters:
+            rows (iterable of (name, score)): Saved highscores, oldest first.
+        '''
+        self.best_name = None
+        self.best_score = None
+        self.player_best = {}
+        self.count = 0
+        for name, score in rows:
+            self.add(name, score)
+
+    @classmethod
+    def from_store(cls, store):
+        '''
+        Builds the index from a HighscoreStore without reading every saved game.
+        '''
+        board = cls()
+        for name, score, count in store.player_bests():
+            board.player_best[name] = score
+            board.count += count
+        best = store.top(1)
+        if best:
+            board.best_name, board.best_score = best[0]
+        return board
+
+    def __len__(self):
+        return self.count
+
+    def add(self, name, score):
+        '''
+        Adds one finished game.
+        '''
+        self.count += 1
+        if self.best_score is None or score > self.best_score:
+            self.best_name = name
+            self.best_score = score
+        if name not in self.player_best or score > self.player_best[name]:
+            self.player_best[name] = score
+
+    def best(self):
+        '''
+        Returns (name, score) of the best game, or (None, None) if there is none.
+        '''
+        return self.best_name, self.best_score
+
+    def best_of(self, name):
+        '''
+        Returns the best score of a player, or None if the player has no saved game.
+        '''
+        return self.player_best.get(name)
@@ -0,0 +1,233 @@
+"""
+Table layouts.
+
+A layout is a JSON file (see tables/default.json) that lists the
+obstacles, bumpers, bats, movers, holes and decoration lines of a table:
+
+    {"name": "Flipper",
+     "size": [600, 800],
+     "holes": {"width": 150, "height": 100},
+     "obstacles": [{"name": "rect1", "rect": [x, y, width, height], "color": "blue"},
+                   {"name": "start_tri", "triangle": [[x, y], [x, y], [x, y]], "color": "red"}, ...],
+     "bumpers": [{"name": "big_ball", "center": [x, y], "radius": 30, "color": "#6203fc"}, ...],
+     "bats": [{"name": "left_bat", "points": [[x, y], ...], "color": "green", "right": false, "anschlag": 50}, ...],
+     "movers": [{"name": "rect1", "speed": 0.5}, ...],
+     "lines": [{"from": [x, y], "to": [x, y], "color": "red"}, ...]}
+
+The game rules refer to some objects by name, so every layout needs the
+bats left_bat, right_bat and starter_bat, the obstacle rect1 (scores on
+every hit, moves sideways) and the bumper big_ball (moves sideways, lets
+ball2 in). Only these two can move, so "movers" may list no other names.
+Everything else is free: a layout may add any number of obstacles and
+bumpers.
+
+compile_layout() turns the description into everything the Table would
+otherwise compute at start: corner points, SAT axes and bounding boxes of
+the obstacles, and the pose table of every bat. load_layout() caches that
+compiled form next to the layout in __pycache__/, keyed by the SHA-256 of
+the file, so a table only pays for the compilation the first time it is
+opened after a change.
+
+The cache holds only plain data (numbers, strings, tuples, lists and dicts,
+written with marshal, Vectors as (x, y) pairs), never pickles: a layout
+downloaded together with a crafted cache file cannot run code when it is
+loaded. A cache that cannot be read or does not match the file is ignored
+and compiled again.
+"""
+import hashlib
+import json
+import marshal
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from classes import Bat, Vector
+from collision import polygon_axes
+
+DEFAULT = Path(__file__).parent / 'tables' / 'default.json'
+
+# Part of the cache key, raise it when the compiled form changes
+COMPILED_VERSION = 2
+
+# Objects the game rules refer to by name
+REQUIRED = {'bats': ('left_bat', 'right_bat', 'starter_bat'),
+            'obstacles': ('rect1',),
+            'bumpers': ('big_ball',)}
+
+# Objects the Table moves and the renderer draws every frame
+MOVERS = ('rect1', 'big_ball')
+
+
+def compile_layout(description, digest=None):
+    '''
+    Compiles a layout description (the parsed JSON) into precomputed geometry.
+
+    Returns:
+        layout (dict): The description with the geometry added to every
+        obstacle ('vertices', 'axes', 'aabb'), bumper ('aabb') and bat
+        ('poses', 'swept_aabb', 'outline'), and 'movers' as name -> speed.
+    '''
+    for section, names in REQUIRED.items():
+        present = [item['name'] for item in description.get(section, [])]
+        for name in names:
+            if name not in present:
+                raise ValueError(f'layout has no {section[:-1]} named {name!r}')
+    for item in description.get('movers', []):
+        if item['name'] not in MOVERS:
+            raise ValueError(f"mover {item['name']!r} cannot move, only {' and '.join(MOVERS)} can")
+
+    obstacles = []
+    for item in description.get('obstacles', []):
+        if 'rect' in item:
+            x, y, width, height = item['rect']
+            vertices = [(x, y), (x + width, y), (x + width, y + height), (x, y + height)]
+        elif 'triangle' in item:
+            vertices = [tuple(point) for point in item['triangle']]
+        else:
+            raise ValueError(f"obstacle {item['name']!r} is neither a rect nor a triangle")
+        xs = [p[0] for p in vertices]
+        ys = [p[1] for p in vertices]
+        obstacles.append(dict(item, vertices=vertices, axes=polygon_axes(vertices),
+                              aabb=(min(xs), min(ys), max(xs), max(ys))))
+
+    bumpers = []
+    for item in description.get('bumpers', []):
+        (x, y), radius = item['center'], item['radius']
+        bumpers.append(dict(item, aabb=(x - radius, y - radius, x + radius, y + radius)))
+
+    bats = []
+    for item in description['bats']:
+        points = [Vector(x, y) for x, y in item['points']]
+        bat = Bat(None, item.get('color', 'green'), points, right=item.get('right', False),
+                  anschlag=item.get('anschlag', 50))
+        pivot = points[0]
+        bats.append(dict(item, poses=bat.poses, swept_aabb=bat.swept_aabb(),
+                         outline=((pivot.x, pivot.y), [(p.x - pivot.x, p.y - pivot.y) for p in points])))
+
+    return {'version': COMPILED_VERSION,
+            'digest': digest,
+            'name': description.get('name', ''),
+            'size': tuple(description.get('size', (600, 800))),
+            'holes': (description['holes']['width'], description['holes']['height']),
+            'obstacles': obstacles,
+            'bumpers': bumpers,
+            'bats': bats,
+            'movers': {item['name']: item['speed'] for item in description.get('movers', [])},
+            'lines': [(tuple(item['from']), tuple(item['to']), item.get('color', 'red'))
+                      for item in description.get('lines', [])]}
+
+
+def cache_path(path, digest):
+    '''
+    Returns the file of the compiled form of a layout.
+    '''
+    path = Path(path)
+    return path.parent / '__pycache__' / f'{path.stem}.{digest[:16]}.v{COMPILED_VERSION}.marshal'
+
+
+def to_data(layout):
+    '''
+    Returns a compiled layout with the Vectors of the bat poses replaced by (x, y) pairs, for marshal.
+    '''
+    bats = []
+    for item in layout['bats']:
+        poses = {angle: ([(p.x, p.y) for p in points], tuples, (center.x, center.y), axes)
+                 for angle, (points, tuples, center, axes) in item['poses'].items()}
+        bats.append(dict(item, poses=poses))
+    return dict(layout, bats=bats)
+
+
+def from_data(data):
+    '''
+    Reverses to_data().
+    '''
+    bats = []
+    for item in data['bats']:
+        poses = {angle: ([Vector(x, y) for x, y in points], tuples, Vector(*center), axes)
+                 for angle, (points, tuples, center, axes) in item['poses'].items()}
+        bats.append(dict(item, poses=poses))
+    return dict(data, bats=bats)
+
+
+def read_cache(compiled, digest):
+    '''
+    Returns the compiled layout in a cache file, None if it is missing, broken or of another file.
+    '''
+    try:
+        data = marshal.loads(compiled.read_bytes())
+        if data['version'] != COMPILED_VERSION or data['digest'] != digest:
+            return None
+        return from_data(data)
+    except Exception:
+        # Anything unexpected in the file only costs a compilation
+        return None
+
+
+def write_cache(path, compiled, layout):
+    '''
+    Writes the cache file of a layout and removes the caches of its older versions.
+    '''
+    folder = compiled.parent
+    folder.mkdir(exist_ok=True)
+    stale = re.compile(re.escape(Path(path).stem) + r'\.[0-9a-f]{16}\.v\d+\.(pickle|marshal)')
+    for old in folder.iterdir():
+        if stale.fullmatch(old.name):
+            old.unlink(missing_ok=True)
+
+    # A private temporary file, so concurrent writers never mix their data
+    with tempfile.NamedTemporaryFile(dir=folder, prefix=compiled.name + '.', suffix='.tmp',
+                                     delete=False) as file:
+        temporary = Path(file.name)
+        file.write(marshal.dumps(to_data(layout)))
+    try:
+        os.replace(temporary, compiled)
+    except OSError:
+        temporary.unlink(missing_ok=True)
+        raise
+
+
+def load_layout(path=DEFAULT, cache=True):
+    '''
+    Loads a layout file, from the compiled cache if the file did not change.
+
+    Parameters:
+        path (str or Path): JSON layout file.
+        cache (bool): Read and write the compiled form in __pycache__/ next to the file.
+
+    Returns:
+        layout (dict): See compile_layout().
+    '''
+    data = Path(path).read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    compiled = cache_path(path, digest)
+    if cache:
+        layout = read_cache(compiled, digest)
+        if layout is not None:
+            return layout
+
+    layout = compile_layout(json.loads(data), digest)
+    if cache:
+        try:
+            write_cache(path, compiled, layout)
+        except OSError:
+            # Read-only folder: the layout works, it is just compiled again next time
+            pass
+    return layout
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT
+    begin = time.perf_counter()
+    compile_layout(json.loads(Path(path).read_bytes()))
+    compiling = time.perf_counter() - begin
+    load_layout(path)
+    begin = time.perf_counter()
+    layout = load_layout(path)
+    cached = time.perf_counter() - begin
+    print(f"{layout['name']}: {len(layout['obstacles'])} obstacles, {len(layout['bumpers'])} bumpers, "
+          f"{len(layout['bats'])} bats, {sum(len(bat['poses']) for bat in layout['bats'])} bat poses")
+    print(f'compiled in {compiling * 1e3:.2f} ms, loaded from the cache in {cached * 1e3:.2f} ms')
@@ -0,0 +1,187 @@
+"""
+Per-phase frame profiler.
+
+    python main.py --profile              # F3 shows the overlay, trace in profile.json
+    python main.py --profile trace.json
+
+Code marks its phases with `with profiler.phase('draw'):`. Hot code that
+runs many times per frame (Table.step) checks profiler.enabled once and
+marks back-to-back phases with `begin = profiler.lap('bats', begin)`
+instead, which costs a single clock read per phase. The time of a phase
+is summed up per frame and written into a ring buffer that holds the
+last `frames` frames of every phase, so the p50/p99 of the overlay always
+describe the recent past and the memory use never grows. Every single
+phase span also goes into a second ring buffer, which is exported as a
+Chrome trace (chrome://tracing or https://ui.perfetto.dev).
+
+Profiling is off by default: NULL_PROFILER has the same interface, but its
+phase() returns one shared no-op context manager and its enabled flag
+turns the lap() marks into a skipped if.
+"""
+import json
+from array import array
+from contextlib import nullcontext
+from time import perf_counter_ns
+
+
+class _Phase:
+    '''
+    Context manager that times one phase, reused for every span of that phase.
+    '''
+    __slots__ = ('profiler', 'name', 'begin')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.begin = 0
+
+    def __enter__(self):
+        self.begin = perf_counter_ns()
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.begin, perf_counter_ns())
+
+
+class FrameProfiler:
+    '''
+    Collects the time of named phases per frame in fixed-size ring buffers.
+
+    A phase may run several times per frame (e.g. physics steps) and phases
+    may be nested, but a phase must not be nested in itself.
+    '''
+    enabled = True
+
+    def __init__(self, frames=600, spans=200000):
+        '''
+        Parameters:
+            frames (int): Frames kept for the percentiles.
+            spans (int): Single phase spans kept for the trace export.
+        '''
+        self.size = frames
+        self.frame = 0
+        self.phases = {}   # name -> _Phase
+        self.totals = {}   # name -> ns in the current frame
+        self.history = {}  # name -> ns per frame, ring buffer of the last frames
+        self.names = []    # phase number -> name, for the span buffer
+        self.numbers = {}  # name -> phase number
+        self.capacity = spans
+        self.spans = 0     # Spans written so far
+        self.span_phase = array('H', bytes(2 * spans))
+        self.span_begin = array('q', bytes(8 * spans))
+        self.span_length = array('q', bytes(8 * spans))
+        self.origin = perf_counter_ns()
+
+    def phase(self, name):
+        '''
+        Returns the context manager that times the phase name.
+        '''
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = _Phase(self, name)
+            self.numbers[name] = len(self.names)
+            self.names.append(name)
+            self.history[name] = array('q', bytes(8 * self.size))
+        return phase
+
+    def add(self, name, begin, end):
+        '''
+        Records one span of a phase (times from perf_counter_ns()).
+        '''
+        if name not in self.phases:
+            self.phase(name)
+        length = end - begin
+        self.totals[name] = self.totals.get(name, 0) + length
+        index = self.spans % self.capacity
+        self.span_phase[index] = self.numbers[name]
+        self.span_begin[index] = begin
+        self.span_length[index] = length
+        self.spans += 1
+
+    def lap(self, name, begin):
+        '''
+        Records the phase name from begin until now and returns now, the begin of the next phase.
+        '''
+        end = perf_counter_ns()
+        self.add(name, begin, end)
+        return end
+
+    def end_frame(self):
+        '''
+        Closes the current frame: the phase times go into the ring buffer.
+        '''
+        index = self.frame % self.size
+        totals = self.totals
+        for name, history in self.history.items():
+            history[index] = totals.get(name, 0)
+        totals.clear()
+        self.frame += 1
+
+    def percentiles(self, name, quantiles=(0.5, 0.99)):
+        '''
+        Returns the given quantiles of the time per frame of a phase in milliseconds.
+        '''
+        count = min(self.frame, self.size)
+        if not count:
+            return tuple(0.0 for _ in quantiles)
+        values = sorted(self.history[name][:count])
+        return tuple(values[min(count - 1, int(q * count))] / 1e6 for q in quantiles)
+
+    def stats(self):
+        '''
+        Returns (name, p50, p99) in milliseconds per frame for every phase, in the order they first ran.
+        '''
+        return [(name, *self.percentiles(name)) for name in self.names]
+
+    def export_chrome_trace(self, path):
+        '''
+        Writes the spans in the buffer as Chrome trace event JSON.
+        '''
+        first = max(0, self.spans - self.capacity)
+        events = []
+        for span in range(first, self.spans):
+            index = span % self.capacity
+            events.append({'name': self.names[self.span_phase[index]], 'ph': 'X', 'pid': 0, 'tid': 0,
+                           'ts': (self.span_begin[index] - self.origin) / 1000,
+                           'dur': self.span_length[index] / 1000})
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+        return len(events)
+
+
+class NullProfiler:
+    '''
+    Profiler that records nothing.
+    '''
+    enabled = False
+    _phase = nullcontext()
+
+    def phase(self, name):
+        return self._phase
+
+    def add(self, name, begin, end):
+        pass
+
+    def lap(self, name, begin):
+        return begin
+
+    def end_frame(self):
+        pass
+
+    def stats(self):
+        return []
+
+    def export_chrome_trace(self, path):
+        return 0
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def overlay_lines(profiler):
+    '''
+    Returns the text lines of the on-screen overlay.
+    '''
+    lines = ['phase        p50 ms  p99 ms']
+    for name, p50, p99 in profiler.stats():
+        lines.append(f'{name:12} {p50:6.2f}  {p99:6.2f}')
+    return lines
@@ -0,0 +1,177 @@
+from collections import OrderedDict
+
+import pygame
+
+from profiler import NULL_PROFILER
+
+colors = {'white': (255, 255, 255),
+          'tuerkis': '#03fcb1',
+          }
+
+
+class TableRenderer:
+    '''
+    Draws a Table on the screen with a cached background layer and dirty rectangles.
+
+    Everything that never moves (background image, help text, holes and all
+    obstacles, bumpers and lines of the layout that are not movers) is
+    composited once into a background layer, which is only rebuilt when the
+    window size changes. Each frame the areas drawn in the previous frame are
+    restored from that layer, the moving objects and the HUD are drawn again,
+    and only those areas are pushed to the display with
+    pygame.display.update(rects).
+    '''
+
+    def __init__(self, screen, table, bg_orig, overlays=()):
+        '''
+        Parameters:
+            screen (Surface): Display surface.
+            table (Table): Table to draw.
+            bg_orig (Surface): Background image, scaled to the window size.
+            overlays (list of (Surface, Rect)): Static texts on top of the background.
+        '''
+        self.screen = screen
+        self.table = table
+        self.bg_orig = bg_orig
+        self.overlays = list(overlays)
+        self.background = None
+        self.size = None
+        self.dirty = []  # Areas drawn in the previous frame
+        self.profiler = NULL_PROFILER  # Times the display update, see profiler.py
+        colors_by_name = {item['name']: item['color'] for item in table.layout['obstacles'] + table.layout['bumpers']}
+        self.rect1_color = colors_by_name['rect1']
+        self.big_ball_color = colors_by_name['big_ball']
+
+    def build_background(self):
+        '''
+        Composites all static table elements into the background layer.
+        '''
+        table = self.table
+        screen = self.screen
+        self.size = screen.get_size()
+        background = pygame.transform.scale(self.bg_orig, self.size).convert()
+
+        for surface, rect in self.overlays:
+            background.blit(surface, rect)
+
+        hole_surface = pygame.Surface((table.hole_w, table.hole_h))
+        hole_surface.fill(colors['white'])
+        background.blit(hole_surface, hole_surface.get_rect(bottomleft = (0, self.size[1])))
+        background.blit(hole_surface, hole_surface.get_rect(bottomright = self.size))
+
+        # Everything of the layout that does not move
+        layout = table.layout
+        for item in layout['obstacles']:
+            if item['name'] in layout['movers']:
+                continue
+            if 'rect' in item:
+                pygame.draw.rect(background, item['color'], item['rect'])
+            else:
+                pygame.draw.polygon(background, item['color'], item['vertices'], 5)
+        for start, end, color in layout['lines']:
+            pygame.draw.line(background, color, start, end)
+        for item in layout['bumpers']:
+            if item['name'] not in layout['movers']:
+                pygame.draw.circle(background, item['color'], item['center'], item['radius'])
+        self.background = background
+
+    def draw_moving(self, hud=(), previous=None, alpha=1.0):
+        '''
+        Draws the moving objects and the HUD and returns the areas they cover.
+
+        Parameters:
+            previous (list): Table.snapshot() of the physics state before the current one.
+            alpha (float): Where to draw between previous (0) and the current state (1).
+        '''
+        screen = self.screen
+        table = self.table
+        rects = []
+        for bat in table.bats:
+            rects.append(pygame.draw.polygon(screen, bat.color, bat.points_tuple))
+
+        positions = table.snapshot()
+        if previous is not None:
+            positions = [(x0 + (x1 - x0) * alpha, y0 + (y1 - y0) * alpha)
+                         for (x0, y0), (x1, y1) in zip(previous, positions)]
+        ball1, ball2, big_ball, rect1 = positions
+
+        rects.append(pygame.draw.circle(screen, (35, 161, 224), ball1, table.ball1.radius))
+        if table.ball2_here:
+            rects.append(pygame.draw.circle(screen, colors['tuerkis'], ball2, table.ball2.radius))
+        rects.append(pygame.draw.circle(screen, self.big_ball_color, big_ball, table.big_ball.radius))
+        rects.append(pygame.draw.rect(screen, self.rect1_color, (rect1[0], rect1[1], table.rect1.width, table.rect1.height)))
+
+        for surface, rect in hud:
+            rects.append(screen.blit(surface, rect))
+        return rects
+
+    def draw(self, hud=(), previous=None, alpha=1.0):
+        '''
+        Draws one frame and updates the display.
+
+        Parameters:
+            hud (list of (Surface, Rect)): Texts that change during the game.
+            previous, alpha: Interpolation between two physics states, see draw_moving().
+        '''
+        screen = self.screen
+        if screen.get_size() != self.size:
+            # New window size: draw everything and flip the whole screen
+            self.build_background()
+            screen.blit(self.background, (0, 0))
+            self.dirty = self.draw_moving(hud, previous, alpha)
+            with self.profiler.phase('display'):
+                pygame.display.flip()
+            return
+
+        # Restore the areas of the last frame from the background layer
+        for rect in self.dirty:
+            screen.blit(self.background, rect, rect)
+
+        rects = self.draw_moving(hud, previous, alpha)
+        with self.profiler.phase('display'):
+            pygame.display.update(self.dirty + rects)
+        self.dirty = rects
+
+
+class TextCache:
+    '''
+    LRU cache for rendered text.
+
+    font.render() rasterizes the whole string on every call, although the HUD
+    texts only change when a score changes. The cache keeps the rendered
+    surfaces together with their rects, keyed by (font, string, color,
+    antialias, position), and drops the least recently used entry when it
+    holds more than maxsize surfaces.
+    '''
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, antialias, color, **position):
+        '''
+        Same as font.render(text, antialias, color), but cached.
+
+        Parameters:
+            position: Keyword arguments for surface.get_rect(), e.g. midbottom=(300, 100).
+
+        Returns:
+            (surface, rect): Rendered text and its rect. The surface is shared
+            with the cache and must not be drawn on.
+        '''
+        key = (font, text, color, antialias, tuple(position.items()))
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            surface = font.render(text, antialias, color)
+            entry = surface, surface.get_rect(**position)
+            self.entries[key] = entry
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        surface, rect = entry
+        return surface, rect.copy()
@@ -0,0 +1,303 @@
+"""
+Binary replays of table sessions.
+
+    python main.py --record session.rpl           # play and record
+    python replay.py session.rpl                  # watch it again
+    python replay.py session.rpl --speed 4 --start 120
+    python replay.py session.rpl --headless --verify
+
+A replay stores the settings of the table and the SHA-256 of its layout
+file in a header, followed by chunks of equal size. Every chunk begins
+with a keyframe (the complete table state of Table.get_state()) and then
+holds one byte of input bits per frame for the next `interval` frames. The table is deterministic, so the inputs are
+enough to rebuild every frame; the keyframes make it possible to jump into
+the middle of a long session. Since every chunk has the same size, the
+position of any frame in the file is known and the file is read through
+mmap without loading it.
+
+With the default interval of 1000 frames (one simulated second) an hour
+of play takes about 4 MB.
+"""
+import mmap
+import struct
+
+from engine import Table
+from layout import DEFAULT as DEFAULT_LAYOUT, load_layout
+
+MAGIC = b'FLPR'
+VERSION = 3
+
+# magic, version, width, height, fps_multiplyer, time_scale, swept, interval, damp, roll, anschlag of the left
+# and the right bat, launch, big_ball_speed, SHA-256 of the layout file
+HEADER = struct.Struct('<4sHHHHH?xIdddddd32s')
+
+# ball1 and ball2 (x, y, vx, vy), big_ball and rect1 (x, y), rect_speed, big_ball_speed, ticks, ball2_time_begin,
+# three bats (angle, direction, count, active), flags, score, best, roundnr, frame
+KEYFRAME = struct.Struct('<16d' + 'hbIb' * 3 + 'BiiII')
+
+# Bits of the flags byte of a keyframe
+BALL2_HERE = 1
+STARTER1 = 2
+STARTER2 = 4
+
+
+def layout_digest(layout):
+    '''
+    Returns the SHA-256 of the layout file as 32 bytes (zeros for a layout that did not come from a file).
+    '''
+    return bytes.fromhex(layout['digest']) if layout.get('digest') else bytes(32)
+
+
+def pack_state(state):
+    '''
+    Packs a state of Table.get_state() into a keyframe.
+    '''
+    flags = (state['ball2_here'] * BALL2_HERE | state['starter1'] * STARTER1 | state['starter2'] * STARTER2)
+    return KEYFRAME.pack(*state['ball1'], *state['ball2'], *state['big_ball'], *state['rect1'],
+                         state['rect_speed'], state['big_ball_speed'], state['ticks'], state['ball2_time_begin'],
+                         *[value for bat in state['bats'] for value in bat],
+                         flags, state['score'], state['best'], state['roundnr'], state['frame'])
+
+
+def unpack_state(data):
+    '''
+    Unpacks a keyframe into a state for Table.set_state().
+    '''
+    values = KEYFRAME.unpack(data)
+    flags, score, best, roundnr, frame = values[28:]
+    return {'ball1': values[0:4],
+            'ball2': values[4:8],
+            'big_ball': values[8:10],
+            'rect1': values[10:12],
+            'rect_speed': values[12],
+            'big_ball_speed': values[13],
+            'ticks': values[14],
+            'ball2_time_begin': values[15],
+            'bats': [values[i:i + 4] for i in range(16, 28, 4)],
+            'ball2_here': bool(flags & BALL2_HERE),
+            'starter1': bool(flags & STARTER1),
+            'starter2': bool(flags & STARTER2),
+            'score': score,
+            'best': best,
+            'roundnr': roundnr,
+            'frame': frame}
+
+
+class ReplayWriter:
+    '''
+    Records the inputs of a table to a replay file.
+
+    record() has to be called with the inputs right before every
+    table.step(), starting with a new table.
+    '''
+
+    def __init__(self, path, table, interval=1000):
+        '''
+        Parameters:
+            path (str or Path): Replay file, overwritten if it exists.
+            table (Table): Table that is recorded.
+            interval (int): Frames per chunk, i.e. between two keyframes.
+        '''
+        self.table = table
+        self.interval = interval
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, table.width, table.height, table.fps_multiplyer,
+                                    table.time_scale, table.swept, interval, table.damp, table.roll,
+                                    table.left_bat.anschlag, table.right_bat.anschlag, table.launch,
+                                    table.big_ball_speed,
+                                    layout_digest(table.layout)))
+        self.frames = 0
+
+    def record(self, inputs):
+        '''
+        Adds the inputs of the next frame.
+        '''
+        if self.frames % self.interval == 0:
+            self.file.write(pack_state(self.table.get_state()))
+        self.file.write(bytes((inputs,)))
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Replay:
+    '''
+    A replay file, opened read-only through mmap.
+    '''
+
+    def __init__(self, path, layout=None):
+        '''
+        Parameters:
+            path (str or Path): Replay file.
+            layout (str, Path or dict): Layout the replay was recorded on (default: tables/default.json).
+        '''
+        with open(path, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.width, self.height, self.fps_multiplyer, self.time_scale, self.swept,
+         self.interval, self.damp, self.roll, left_anschlag, right_anschlag, self.launch,
+         self.big_ball_speed, digest) = HEADER.unpack_from(self.data)
+        self.anschlag = (int(left_anschlag), int(right_anschlag))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a replay of version {VERSION}')
+        self.layout = layout if isinstance(layout, dict) else load_layout(layout or DEFAULT_LAYOUT)
+        if digest != layout_digest(self.layout):
+            raise ValueError(f'{path} was recorded on another table layout')
+        self.chunk_size = KEYFRAME.size + self.interval
+        self.step_ms = 1000 / (200 * self.fps_multiplyer) * self.time_scale
+
+        # The last chunk may be cut short, e.g. if the game was not closed properly
+        body = len(self.data) - HEADER.size
+        chunks, rest = divmod(body, self.chunk_size)
+        self.frames = chunks * self.interval + max(0, rest - KEYFRAME.size)
+
+    def __len__(self):
+        return self.frames
+
+    def close(self):
+        self.data.close()
+
+    def table(self):
+        '''
+        Returns a new table with the settings of the recorded one.
+        '''
+        return Table(self.width, self.height, self.fps_multiplyer, self.swept, self.time_scale,
+                     self.damp, self.roll, self.anschlag, self.launch, self.big_ball_speed, self.layout)
+
+    def keyframe(self, chunk):
+        '''
+        Returns the state at the beginning of a chunk.
+        '''
+        offset = HEADER.size + chunk * self.chunk_size
+        return unpack_state(self.data[offset:offset + KEYFRAME.size])
+
+    def inputs(self, start=0, stop=None):
+        '''
+        Yields the input bits of the frames start to stop.
+        '''
+        stop = self.frames if stop is None else min(stop, self.frames)
+        frame = start
+        while frame < stop:
+            chunk, index = divmod(frame, self.interval)
+            offset = HEADER.size + chunk * self.chunk_size + KEYFRAME.size
+            end = min(stop - frame + index, self.interval)
+            yield from self.data[offset + index:offset + end]
+            frame += end - index
+
+    def seek(self, frame, table=None, backend='reference'):
+        '''
+        Returns a table in the state before the given frame, starting from the nearest keyframe.
+
+        Parameters:
+            backend (str): Physics backend for the frames after the keyframe, see backends.load().
+        '''
+        table = table or self.table()
+        chunk = min(frame, self.frames) // self.interval
+        if chunk * self.interval == self.frames and chunk:
+            chunk -= 1
+        table.set_state(self.keyframe(chunk))
+        if backend == 'reference':
+            for inputs in self.inputs(chunk * self.interval, frame):
+                table.step(inputs)
+            return table
+
+        # Only the headless replays need NumPy and the kernels
+        import backends
+        runner = backends.load(table, backend)
+        runner.run(bytearray(self.inputs(chunk * self.interval, frame)), trajectory=False)
+        return runner.sync()
+
+    def verify(self):
+        '''
+        Plays the whole replay from the start and compares every keyframe.
+
+        Returns:
+            frame (int): First frame where the replay differs from the recording, or None.
+        '''
+        table = self.seek(0)
+        for frame, inputs in enumerate(self.inputs()):
+            if frame % self.interval == 0 and pack_state(table.get_state()) != pack_state(self.keyframe(frame // self.interval)):
+                return frame
+            table.step(inputs)
+        return None
+
+
+def watch(replay, start=0, speed=1.0, render_fps=144):
+    '''
+    Shows a replay on the screen, speed times faster than it was played.
+    '''
+    import pygame
+    from pathlib import Path
+
+    from render import TableRenderer, TextCache
+    from timing import FixedTimestep
+
+    pygame.init()
+    screen = pygame.display.set_mode((replay.width, replay.height))
+    pygame.display.set_caption('Flipper replay')
+    table = replay.seek(start)
+    bg_orig = pygame.image.load(Path(__file__).parents[0] / Path("bkg2.png")).convert_alpha()
+    font = pygame.font.Font(None, 25)
+    texts = TextCache()
+    renderer = TableRenderer(screen, table, bg_orig)
+    timestep = FixedTimestep(table.step_ms / speed)
+    clock = pygame.time.Clock()
+    inputs = replay.inputs(start)
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+
+        for _ in range(timestep.advance(clock.tick(render_fps))):
+            frame_inputs = next(inputs, None)
+            if frame_inputs is None:
+                running = False
+                break
+            table.step(frame_inputs)
+
+        hud = [texts.render(font, f'Score: {table.score}', False, 'White', midbottom=(300, 100)),
+               texts.render(font, f'Replay {table.ticks / 1000:.0f} s, x{speed:g}', False, 'White', midbottom=(300, 130))]
+        renderer.draw(hud)
+    pygame.quit()
+
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Plays a recorded session.')
+    parser.add_argument('path')
+    parser.add_argument('--layout', help='table layout the replay was recorded on')
+    parser.add_argument('--start', type=float, default=0, help='start at this simulated second')
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--headless', action='store_true', help='simulate without a window and print the result')
+    parser.add_argument('--verify', action='store_true', help='check the whole replay against its keyframes')
+    parser.add_argument('--backend', default='reference', choices=('reference', 'numba', 'auto'),
+                        help='physics backend of --headless, see backends.py')
+    args = parser.parse_args()
+
+    replay = Replay(args.path, args.layout)
+    start = int(args.start * 1000 / replay.step_ms)
+    print(f'{len(replay)} frames, {len(replay) * replay.step_ms / 1000:.0f} s')
+    if args.verify:
+        frame = replay.verify()
+        print('replay is deterministic' if frame is None else f'replay differs from the recording at frame {frame}')
+    if args.headless:
+        begin = time.perf_counter()
+        table = replay.seek(len(replay), backend=args.backend)
+        elapsed = time.perf_counter() - begin
+        print(f'score: {table.score}, round: {table.roundnr}, highscore: {table.highscore} ({elapsed:.2f} s)')
+    elif not args.verify:
+        watch(replay, start, args.speed)
+    replay.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+import numpy as np
+
+from collision import circle_sat
+
+
+class PolygonPack:
+    '''
+    All table polygons packed into NumPy arrays for a batched circle test.
+
+    Every polygon is stored with its corner points, its edge normals and the
+    projection interval [low, high] of the polygon on each normal, padded to
+    the largest number of edges. Padding edges are masked out, so they never
+    separate and never give the smallest depth; padding corners repeat the
+    first corner. One call of collide() tests any number of balls
+    against all polygons at once and gives the same hit flags, normals and
+    depths as collision.circle_sat(), which Ball.sat_algo, Rect.contact and
+    Triangle.contact use.
+
+    The polygons are taken from the objects themselves (polygon() of the
+    bats, Rects and Triangles), so refresh() only has to be called for the
+    objects that moved.
+
+    Attributes:
+        objects (list): Packed objects, row i of every array belongs to objects[i].
+        vertices (ndarray, shape (p, v, 2)): Corner points.
+        normals (ndarray, shape (p, v, 2)): Edge normals.
+        low, high (ndarray, shape (p, v)): Projection intervals.
+        valid (ndarray, shape (p, v)): False for the padding edges.
+    '''
+
+    def __init__(self, objects, edges=4):
+        '''
+        Parameters:
+            objects (list): Bats, Rects and Triangles, or (vertices, axes) tuples of their polygon().
+            edges (int): Largest number of edges of a polygon.
+        '''
+        self.objects = list(objects)
+        count = len(self.objects)
+        self.vertices = np.zeros((count, edges, 2))
+        self.normals = np.zeros((count, edges, 2))
+        self.low = np.full((count, edges), -np.inf)
+        self.high = np.full((count, edges), np.inf)
+        self.valid = np.zeros((count, edges), dtype=bool)
+        self.refresh()
+
+    @classmethod
+    def from_table(cls, table):
+        '''
+        Packs the bats that can hit a ball and all obstacles of a Table.
+        '''
+        return cls([table.left_bat, table.right_bat] + table.obstacles)
+
+    def refresh(self, objects=None):
+        '''
+        Copies the current polygons of the given objects (default: all) into the arrays.
+        '''
+        rows = range(len(self.objects)) if objects is None else [self.objects.index(obj) for obj in objects]
+        for row in rows:
+            obj = self.objects[row]
+            vertices, axes = obj if isinstance(obj, tuple) else obj.polygon()
+            self.vertices[row] = vertices[0]
+            self.vertices[row, :len(vertices)] = vertices
+            self.valid[row] = False
+            for edge, (nx, ny, low, high) in enumerate(axes):
+                self.normals[row, edge] = nx, ny
+                self.low[row, edge] = low
+                self.high[row, edge] = high
+                self.valid[row, edge] = True
+
+    def collide(self, x, y, radius):
+        '''
+        Circle test of every ball against every polygon.
+
+        Parameters:
+            x, y, radius (array-like, shape (b,)): Ball centers and radii.
+
+        Returns:
+            hit, normal, depth: See circle_polygons(), with shapes (b, p), (b, p, 2) and (b, p).
+        '''
+        x = np.asarray(x, dtype=float)[:, None, None]
+        y = np.asarray(y, dtype=float)[:, None, None]
+        radius = np.asarray(radius, dtype=float)[:, None, None]
+        return circle_polygons(x, y, radius, self.vertices[None], self.normals[None],
+                               self.low[None], self.high[None], self.valid[None])
+
+    def collide_balls(self, balls):
+        '''
+        collide() for a list of Ball objects or a BallArray.
+        '''
+        if isinstance(balls, (list, tuple)):
+            return self.collide([ball.position.x for ball in balls], [ball.position.y for ball in balls],
+                                [ball.radius for ball in balls])
+        return self.collide(balls.position[:, 0], balls.position[:, 1], balls.radius)
+
+
+def circle_polygons(x, y, radius, vertices, normals, low, high, valid):
+    '''
+    collision.circle_sat() of b balls against p polygons in NumPy.
+
+    Parameters:
+        x, y, radius (ndarray, shape (b, 1, 1)): Ball centers and radii.
+        vertices, normals (ndarray, shape (b or 1, p, v, 2)): Corner points and edge normals, see PolygonPack.
+        low, high, valid (ndarray, shape (b or 1, p, v)): Projection intervals and the mask of real edges.
+
+    Returns:
+        hit (ndarray of bool, shape (b, p)): Ball i overlaps polygon j.
+        normal (ndarray, shape (b, p, 2)): Contact normal from the polygon to the ball (zero without a hit).
+        depth (ndarray, shape (b, p)): Penetration depth (zero without a hit).
+    '''
+    # Edge axes, the edge lies at high
+    nx = normals[..., 0]
+    ny = normals[..., 1]
+    center = x * nx + y * ny
+    separated = valid & ((center - radius > high) | (center + radius < low))
+    corner = (valid & (center > high)).any(axis=2, keepdims=True)
+    depths = np.where(valid, high - center + radius, np.inf)
+    edge_normals = np.broadcast_to(normals, depths.shape + (2,))
+
+    # Axis through the closest corner, only where the center is outside of the polygon
+    vx = vertices[..., 0]
+    vy = vertices[..., 1]
+    dx = x - vx
+    dy = y - vy
+    closest = (dx * dx + dy * dy).argmin(axis=2)[..., None]
+    cx = np.take_along_axis(dx, closest, axis=2)
+    cy = np.take_along_axis(dy, closest, axis=2)
+    distance = np.where(corner, np.sqrt(cx * cx + cy * cy), 1.0)
+    cx = cx / distance
+    cy = cy / distance
+    corner_center = x * cx + y * cy
+    projections = vx * cx + vy * cy
+    corner_high = projections.max(axis=2, keepdims=True)
+    corner_low = projections.min(axis=2, keepdims=True)
+    separated_corner = corner & ((corner_center - radius > corner_high) | (corner_center + radius < corner_low))
+    corner_depth = np.where(corner, corner_high - corner_center + radius, np.inf)
+
+    hit = ~(separated.any(axis=2) | separated_corner[..., 0])
+    depths = np.concatenate((depths, corner_depth), axis=2)
+    normals = np.concatenate((edge_normals, np.stack((cx, cy), axis=-1)), axis=2)
+    axis = depths.argmin(axis=2)[..., None]
+    depth = np.take_along_axis(depths, axis, axis=2)[..., 0]
+    normal = np.take_along_axis(normals, axis[..., None], axis=2)[:, :, 0]
+
+    depth = np.where(hit, depth, 0.0)
+    normal = np.where(hit[..., None], normal, 0.0)
+    return hit, normal, depth
+
+
+def reference(obj, ball):
+    '''
+    collision.circle_sat() of one object and one ball, the Python version of PolygonPack.collide().
+
+    Returns:
+        (hit, normal, depth) with normal as (x, y).
+    '''
+    hit, nx, ny, depth = circle_sat(ball.position.x, ball.position.y, ball.radius, *obj.polygon())
+    return hit, (nx, ny), depth
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    from classes import Ball, Vector
+    from engine import Table, autoplay
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    table = Table()
+    for _ in range(300):
+        table.step(autoplay(table))
+    pack = PolygonPack.from_table(table)
+
+    rng = np.random.default_rng(0)
+    balls = [Ball(None, Vector(*rng.uniform((0, 0), (600, 760))), Vector(0, 0), 10) for _ in range(n)]
+
+    # Same answers as the Python tests
+    hit, normal, depth = pack.collide_balls(balls)
+    mismatches = 0
+    for i, ball in enumerate(balls):
+        for j, obj in enumerate(pack.objects):
+            ref_hit, ref_normal, ref_depth = reference(obj, ball)
+            if (ref_hit != hit[i, j] or not np.allclose(ref_normal, normal[i, j])
+                    or not np.isclose(ref_depth, depth[i, j])):
+                mismatches += 1
+    print(f'{n} balls x {len(pack.objects)} polygons: {int(hit.sum())} hits, {mismatches} mismatches')
+
+    begin = time.perf_counter()
+    for ball in balls:
+        for obj in pack.objects:
+            reference(obj, ball)
+    loops = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    pack.collide_balls(balls)
+    batched = time.perf_counter() - begin
+    print(f'Python loops {loops * 1e3:.1f} ms, PolygonPack {batched * 1e3:.1f} ms')
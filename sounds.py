@@ -0,0 +1,89 @@
+from collections import deque
+from pathlib import Path
+
+import pygame
+
+# Sound effect for each table event, paths are relative to the game folder
+EFFECTS = {'bumper': 'sound.wav'}
+
+
+class SoundBank:
+    '''
+    Sound effects for table events.
+
+    Every effect is decoded once when the bank is created. Effects play on a
+    fixed pool of mixer channels, and each effect may only be retriggered
+    `limit` times per `window` milliseconds, so a ball that rests against a
+    bumper for many frames does not stack up overlapping plays.
+
+    Without a working mixer (or for missing files) the bank stays silent.
+    '''
+
+    def __init__(self, effects=EFFECTS, channels=4, limit=1, window=100, folder=Path(__file__).parent):
+        '''
+        Parameters:
+            effects (dict): Event name -> sound file.
+            channels (int): Size of the channel pool.
+            limit (int): Plays per effect and time window.
+            window (int): Length of the time window in milliseconds.
+            folder (Path): Folder of the sound files.
+        '''
+        self.limit = limit
+        self.window = window
+        self.sounds = {}
+        self.channels = []
+        self.next_channel = 0
+        self.played = {name: deque() for name in effects}
+
+        if pygame.mixer.get_init() is None:
+            try:
+                pygame.mixer.init()
+            except pygame.error:
+                return
+
+        for name, file in effects.items():
+            try:
+                self.sounds[name] = pygame.mixer.Sound(Path(folder) / file)
+            except (pygame.error, FileNotFoundError):
+                pass
+
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), channels))
+        self.channels = [pygame.mixer.Channel(i) for i in range(channels)]
+
+    def play(self, name, now=None):
+        '''
+        Plays the effect of an event.
+
+        Parameters:
+            name (str): Event name, events without an effect are ignored.
+            now (int): Current time in milliseconds (default: pygame.time.get_ticks()).
+
+        Returns:
+            played (bool): False if the effect is unknown, muted or rate limited.
+        '''
+        sound = self.sounds.get(name)
+        if sound is None:
+            return False
+        if now is None:
+            now = pygame.time.get_ticks()
+
+        # Forget plays that left the time window
+        played = self.played[name]
+        while played and now - played[0] >= self.window:
+            played.popleft()
+        if len(played) >= self.limit:
+            return False
+        played.append(now)
+
+        # Take the next free channel of the pool; if all are busy, the next one
+        # in turn is the one that was started longest ago
+        count = len(self.channels)
+        for offset in range(count):
+            index = (self.next_channel + offset) % count
+            if not self.channels[index].get_busy():
+                break
+        else:
+            index = self.next_channel
+        self.next_channel = (index + 1) % count
+        self.channels[index].play(sound)
+        return True
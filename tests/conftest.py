@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules of the game live at the top of the repository
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
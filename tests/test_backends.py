@@ -0,0 +1,57 @@
+import pytest
+
+import backends
+from engine import Table, autoplay
+
+# Long enough for ball2, drains and several rounds
+FRAMES = 12000
+
+
+@pytest.fixture(scope='module')
+def recording():
+    inputs, trajectory = backends.record(Table(), FRAMES, autoplay)
+    assert trajectory[:, 9].max() >= 2, 'the recording should cover several rounds'
+    return inputs, trajectory
+
+
+def test_reference_backend_reproduces_recording(recording):
+    inputs, trajectory = recording
+    frame, deviation = backends.cross_check(backends.ReferenceBackend(Table()), inputs, trajectory)
+    assert frame is None
+    assert deviation == 0.0
+
+
+def test_kernel_as_python_matches_reference(recording):
+    inputs, trajectory = recording
+    frame, deviation = backends.cross_check(backends.NumbaBackend(Table(), compiled=False), inputs, trajectory)
+    assert frame is None, f'kernel leaves the reference at frame {frame}'
+    assert deviation <= 1e-6
+
+
+def test_numba_kernel_matches_reference(recording):
+    if backends.numba is None:
+        pytest.skip('numba is not installed')
+    inputs, trajectory = recording
+    frame, deviation = backends.cross_check(backends.NumbaBackend(Table()), inputs, trajectory)
+    assert frame is None, f'numba kernel leaves the reference at frame {frame}'
+    assert deviation <= 1e-6
+
+
+def test_numba_backend_step_and_sync_match_table():
+    reference = Table()
+    backend = backends.NumbaBackend(Table(), compiled=backends.numba is not None)
+    for _ in range(3000):
+        inputs = autoplay(reference)
+        assert sorted(reference.step(inputs)) == sorted(backend.step(inputs))
+    table = backend.sync()
+    assert table.get_state() == reference.get_state()
+    assert table.highscore == reference.highscore
+
+
+def test_load_falls_back_to_reference_without_numba(monkeypatch):
+    monkeypatch.setattr(backends, 'numba', None)
+    assert isinstance(backends.load(Table(), 'auto'), backends.ReferenceBackend)
+    with pytest.warns(UserWarning):
+        assert isinstance(backends.load(Table(), 'numba'), backends.ReferenceBackend)
+    with pytest.raises(ImportError):
+        backends.NumbaBackend(Table())
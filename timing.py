@@ -0,0 +1,149 @@
+from collections import deque
+
+import pygame
+
+
+class FixedTimestep:
+    '''
+    Accumulator that decouples the physics rate from the render rate.
+
+    The real time that passed between two rendered frames is collected in an
+    accumulator and paid out in physics steps of a fixed length, so the table
+    runs at the same simulated speed on slow and fast machines while the
+    screen is only drawn as often as needed. The time left over in the
+    accumulator (alpha, between 0 and 1 step) is used to interpolate the
+    drawn positions between the last two physics states.
+    '''
+
+    def __init__(self, step_ms, max_steps=250):
+        '''
+        Parameters:
+            step_ms (float): Simulated time of one physics step in milliseconds.
+            max_steps (int): Most steps per frame; time beyond that is dropped
+                so a long stall (e.g. dragging the window) cannot snowball.
+        '''
+        self.step_ms = step_ms
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+
+    def advance(self, elapsed_ms):
+        '''
+        Adds the real time of one frame and returns how many physics steps to run.
+        '''
+        self.accumulator += elapsed_ms
+        steps = int(self.accumulator // self.step_ms)
+        if steps > self.max_steps:
+            steps = self.max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.step_ms
+        return steps
+
+    @property
+    def alpha(self):
+        '''
+        Fraction of a physics step that is still in the accumulator.
+        '''
+        return self.accumulator / self.step_ms
+
+
+class FrameScheduler:
+    '''
+    Paces the drawn frames: full rate while something happens, a low rate while the table is idle.
+
+    The game loop tells tick() every frame whether the scene is active (a
+    ball in play, keys pressed). After idle_after_ms without activity the
+    scheduler drops to idle_fps, and events() blocks in pygame.event.wait()
+    until an event arrives or the next idle frame is due, so an idle cabinet
+    sleeps instead of drawing the same picture 144 times a second. Any event
+    or activity brings the full rate back in the same frame.
+
+    The achieved frame rate is measured over the last `window` frames, so it
+    can be shown next to the target rate.
+    '''
+
+    def __init__(self, target_fps=144, idle_fps=10, idle_after_ms=3000, window=60):
+        '''
+        Parameters:
+            target_fps (int): Frames per second while the scene is active.
+            idle_fps (int): Frames per second while it is idle.
+            idle_after_ms (int): Time without activity until the scene counts as idle.
+            window (int): Frames the achieved frame rate is measured over.
+        '''
+        self.target_fps = target_fps
+        self.idle_fps = idle_fps
+        self.idle_after_ms = idle_after_ms
+        self.clock = pygame.time.Clock()
+        self.idle = False
+        self.last_active = pygame.time.get_ticks()
+        self.last_tick = self.last_active
+        self.frame_times = deque(maxlen=window)
+        self.frames = 0
+        self.idle_frames = 0
+
+    @property
+    def fps(self):
+        '''
+        Current target frame rate.
+        '''
+        return self.idle_fps if self.idle else self.target_fps
+
+    @property
+    def achieved(self):
+        '''
+        Frames per second over the last frames.
+        '''
+        total = sum(self.frame_times)
+        return len(self.frame_times) * 1000 / total if total else 0.0
+
+    def wake(self, now=None):
+        '''
+        Marks the scene as active, back to the full frame rate.
+        '''
+        self.last_active = pygame.time.get_ticks() if now is None else now
+        self.idle = False
+
+    def events(self):
+        '''
+        Returns the pending events. While idle, waits for the first one until the next frame is due.
+        '''
+        if self.idle:
+            timeout = int(1000 / self.idle_fps - (pygame.time.get_ticks() - self.last_tick))
+            # A timeout of 0 would wait forever
+            if timeout > 0:
+                event = pygame.event.wait(timeout)
+                if event.type != pygame.NOEVENT:
+                    self.wake()
+                    return [event] + pygame.event.get()
+        events = pygame.event.get()
+        if events:
+            self.wake()
+        return events
+
+    def tick(self, active=False):
+        '''
+        Ends a frame: waits until the next frame at the current rate is due.
+
+        Parameters:
+            active (bool): Something moved or was pressed in this frame.
+
+        Returns:
+            elapsed_ms (int): Real time since the last tick, e.g. for FixedTimestep.advance().
+        '''
+        now = pygame.time.get_ticks()
+        if active:
+            self.wake(now)
+        elif not self.idle and now - self.last_active > self.idle_after_ms:
+            self.idle = True
+        elapsed = self.clock.tick(self.fps)
+        self.last_tick = pygame.time.get_ticks()
+        self.frame_times.append(elapsed)
+        self.frames += 1
+        self.idle_frames += self.idle
+        return elapsed
+
+    def report(self):
+        '''
+        Returns the achieved and the target frame rate as text.
+        '''
+        return f"{self.achieved:.0f}/{self.fps} fps{' (idle)' if self.idle else ''}"